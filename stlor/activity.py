@@ -4,10 +4,22 @@ from typing import Optional, TypedDict
 from stlor.config import (
     STATE_ACTIVITY_CODES,
     ACTIVITY_REWRITE_RULES,
+    ACTIVITY_NAME_REWRITES,
     ACTIVITY_RIGHTS_TYPE,
 )
-from stlor.constants import STATE, RIGHTS_TYPE, ACTIVITY, ACTIVITY_INFO, ACTIVITY_INFO_2
+from stlor.constants import (
+    STATE,
+    RIGHTS_TYPE,
+    ACTIVITY,
+    ACTIVITY_INFO,
+    ACTIVITY_INFO_2,
+    ACTIVITY_INFO_COLUMNS,
+    ACTIVITY_INFO_FIELDS,
+    ACTIVITY_NAME,
+    ROW_IDX,
+)
 from stlor.entities import StateActivityDataSource, RightsType
+from stlor.schema import apply_schema
 
 
 def translate_state_activity_code(state: str, activity_code: float | int | str) -> str:
@@ -54,7 +66,7 @@ def get_activity_column(
 
     return [
         original_col
-        for original_col, output_column, in activity_rewrite_rules.items()
+        for original_col, output_column in activity_rewrite_rules.items()
         if output_column.lower() == ACTIVITY
     ]
 
@@ -112,6 +124,141 @@ def get_activity_name(
     return activity_name if activity_name else activity.name
 
 
+def _as_single_row_values(values: pd.Series) -> pd.Series:
+    """Coerce each value of a column the way get_activity_name sees it: as the
+    first element of a single-row DataFrame column's values (e.g. a Python int
+    becomes an np.int64, and a Timestamp becomes an np.datetime64).
+
+    Each distinct value is coerced once. Values are grouped by type first, so
+    equal values of different types (e.g. True and 1) are coerced separately.
+
+    Arguments:
+    values -- the column
+
+    Returns:
+    pd.Series -- the coerced values, positionally indexed
+    """
+    values = pd.Series(values.tolist(), dtype=object)
+    coerced = values.copy()
+
+    for _, group in values.groupby(values.map(type), sort=False):
+        # Missing values (None, NaN, pd.NA, ...) of a type all coerce alike,
+        # and are kept out of factorize, which would turn them into NaN.
+        missing = group.isna()
+        present = group[~missing]
+
+        codes, uniques = pd.factorize(present.to_numpy())
+        coerced_uniques = [pd.Series([value]).values[0] for value in uniques]
+        coerced[present.index] = pd.Series(
+            [coerced_uniques[code] for code in codes],
+            index=present.index,
+            dtype=object,
+        )
+
+        if missing.any():
+            coerced_missing = pd.Series([group[missing].iloc[0]]).values[0]
+            coerced[missing[missing].index] = pd.Series(
+                [coerced_missing] * missing.sum(),
+                index=missing[missing].index,
+                dtype=object,
+            )
+
+    return coerced
+
+
+def resolve_activity_names(
+    state: str, activity: StateActivityDataSource, activity_gdf: pd.DataFrame
+) -> pd.Series:
+    """Resolve the activity name of every row in an activity layer at once.
+
+    This is the columnar equivalent of calling get_activity_name on each row
+    and then applying ACTIVITY_NAME_REWRITES.
+
+    Arguments:
+    state -- the activity's associated state abbreviation
+    activity -- the activity data source
+    activity_gdf -- the activity layer
+
+    Returns:
+    pd.Series -- the human-readable activity name of each row, aligned with
+    activity_gdf
+    """
+    # Work positionally, restoring activity_gdf's index at the end.
+    n = len(activity_gdf)
+    names = pd.Series([None] * n, dtype=object)
+    appendages = pd.Series([None] * n, dtype=object)
+    has_appendage = pd.Series(False, index=names.index)
+
+    # Rows with a truthy appendage value use the data source's name.
+    if activity.use_name_as_activity and activity.activity_name_appendage_col:
+        col = activity_gdf[activity.activity_name_appendage_col]
+        values = _as_single_row_values(col)
+        has_appendage = values.map(bool).astype(bool)
+        names[has_appendage] = activity.name
+        appendages[has_appendage] = values[has_appendage]
+
+    # Remaining rows take the first activity column whose value doesn't read
+    # as "None".
+    for activity_col in get_activity_column(state, activity) or []:
+        if not activity_col or activity_col not in activity_gdf.columns:
+            continue
+
+        col = activity_gdf[activity_col].reset_index(drop=True)
+        values = col[names.isna()].map(str)
+        values = values[[("None" not in v) for v in values]]
+        names[values.index] = values
+
+    has_name = names.notna()
+    with_appendage = has_name & has_appendage
+    if state == "WI":
+        rendered = appendages[with_appendage].map(
+            lambda code: str(translate_state_activity_code(state, code))
+        )
+    else:
+        rendered = appendages[with_appendage].map(str)
+        translated = names.map(STATE_ACTIVITY_CODES.get(state, {}))
+        names = names.where(translated.isna(), translated)
+
+    names[with_appendage] = names[with_appendage] + " - " + rendered
+
+    names = names.where(names.notna() & (names != ""), activity.name)
+    rewritten = names.map(ACTIVITY_NAME_REWRITES)
+    names = names.where(rewritten.isna(), rewritten)
+
+    return names.set_axis(activity_gdf.index)
+
+
+def get_required_columns(
+    state: str, activity: StateActivityDataSource, available: list[str]
+) -> list[str]:
+    """Determine which columns of an activity layer the activity match reads.
+
+    These are the data source's keep_cols, the columns named in its rewrite
+    rules, its activity name appendage column, and, for states whose inactive
+    activities are excluded, any status columns.
+
+    Arguments:
+    state -- the activity's associated state abbreviation
+    activity -- the activity data source
+    available -- the attribute columns present in the activity layer
+
+    Returns:
+    list[str] -- the required columns, in the activity layer's column order
+    """
+    state_rules = ACTIVITY_REWRITE_RULES.get(state, {})
+    required = set(activity.keep_cols)
+    required.update(state_rules.get(activity.name.lower(), {}))
+    required.update(state_rules.get(activity.name, {}))
+    if activity.activity_name_appendage_col:
+        required.add(activity.activity_name_appendage_col)
+
+    return [
+        col
+        for col in available
+        if col in required or (state in ("MT", "ID") and "stat" in col)
+    ]
+
+
 def is_compatible_activity(
     parcel, activity: StateActivityDataSource, activity_name: str, state: str
 ) -> bool:
@@ -200,7 +347,7 @@ def capture_lessee_and_lease_type(
     activity: StateActivityDataSource,
     activity_name: str,
     state: str,
-) -> str:
+) -> Optional[ActivityInfo]:
     """Capture the lessee and lease type information for an activity.
 
     Arguments:
@@ -210,25 +357,100 @@ def capture_lessee_and_lease_type(
     state -- the activity's associated state abbreviation
 
     Returns:
-    str -- the formatted activity information string
+    Optional[ActivityInfo] -- the activity's information, with every field as
+    it is rendered in the activity_info column, or None if the activity has no
+    information to capture
     """
     if activity.name not in ACTIVITY_REWRITE_RULES.get(state):
-        return
+        return None
 
     activity_info = {
         "layer_index": f"{state}-{activity.name}",
-        "activity": activity_name,
+        "activity": str(activity_name),
         "lease_status": "",
         "lessee": "",
     }
 
     for key, val in ACTIVITY_REWRITE_RULES.get(state).get(activity.name).items():
         if val == "lessee":
-            activity_info["lessee"] = activity_row[key]
+            activity_info["lessee"] = str(activity_row[key])
         if val == "lease_status":
-            activity_info["lease_status"] = activity_row[key]
+            activity_info["lease_status"] = str(activity_row[key])
+
+    return activity_info
+
+
+def fmt_activity_info_entries(activity_info: pd.DataFrame) -> pd.Series:
+    """Format the entries of an activity info table for display. This is the
+    vectorized equivalent of calling fmt_single_activity_info for each entry,
+    with surrounding whitespace stripped.
+
+    Arguments:
+    activity_info -- a table of activity information, with a column for each of
+    ACTIVITY_INFO_FIELDS
+
+    Returns:
+    pd.Series -- the formatted activity information string of each entry
+    """
+    info = pd.Series("", index=activity_info.index, dtype=object)
+    for i, key in enumerate(ACTIVITY_INFO_FIELDS):
+        info += f"{' ' if i else ''}{key}: " + activity_info[key].astype(str)
+
+    return info.str.strip()
+
+
+def build_activity_info(matches: pd.DataFrame) -> pd.DataFrame:
+    """Collect the activity information of a long-form table of matches into an
+    activity info table.
+
+    Matches without information are dropped, as are duplicate entries for the
+    same parcel. Each parcel's entries are ordered by their formatted string,
+    the order they are rendered and their lessees are listed in.
+
+    Arguments:
+    matches -- a long-form table of matches, with MATCH_COLUMNS
+
+    Returns:
+    pd.DataFrame -- a long-form table of activity information, with
+    ACTIVITY_INFO_COLUMNS, keyed by STL parcel row index
+    """
+    activity_info = matches[matches[ACTIVITY_INFO_FIELDS[0]].notna()].rename(
+        columns={ACTIVITY_NAME: ACTIVITY}
+    )[ACTIVITY_INFO_COLUMNS]
+
+    info = fmt_activity_info_entries(activity_info)
+    keep = ~pd.concat([activity_info[ROW_IDX], info], axis=1).duplicated()
+
+    return apply_schema(
+        activity_info[keep]
+        .assign(_info=info[keep])
+        .sort_values([ROW_IDX, "_info"], kind="stable")
+        .drop(columns="_info")
+        .reset_index(drop=True)
+    )
+
+
+def render_activity_info(activity_info: pd.DataFrame, index: pd.Index) -> pd.Series:
+    """Render the activity_info column from an activity info table: each
+    parcel's entries, formatted and joined one per line, or "" if it has none.
 
-    return fmt_single_activity_info(activity_info)
+    Arguments:
+    activity_info -- a long-form table of activity information, as returned by
+    build_activity_info
+    index -- the row labels of the parcels to render
+
+    Returns:
+    pd.Series -- the activity_info column, indexed by index
+    """
+    activity_info = activity_info[activity_info[ROW_IDX].isin(index)]
+    info = fmt_activity_info_entries(activity_info)
+
+    return (
+        info.groupby(activity_info[ROW_IDX], sort=False)
+        .agg("\n".join)
+        .reindex(index, fill_value="")
+        .rename(ACTIVITY_INFO)
+    )
 
 
 def concatenate_activity_info(row: dict) -> str:
@@ -252,3 +474,29 @@ def concatenate_activity_info(row: dict) -> str:
         return activity_info_2
     else:
         return ""
+
+
+def concatenate_activity_info_columns(
+    activity_info: pd.Series, activity_info_2: pd.Series
+) -> pd.Series:
+    """Concatenate the activity_info and activity_info_2 columns, using \n to
+    join the two strings. This is the vectorized equivalent of calling
+    concatenate_activity_info for each row, with missing values read as empty
+    strings.
+
+    Arguments:
+    activity_info -- the activity_info column
+    activity_info_2 -- the activity_info_2 column, sharing activity_info's index
+
+    Returns:
+    pd.Series -- the concatenated activity information strings
+    """
+    activity_info = activity_info.fillna("").str.strip()
+    activity_info_2 = activity_info_2.fillna("").str.strip()
+
+    return activity_info.where(
+        activity_info_2 == "",
+        activity_info_2.where(
+            activity_info == "", activity_info + "\n" + activity_info_2
+        ),
+    )
@@ -1,147 +1,219 @@
 import logging
 from pathlib import Path
-from typing import Literal
+import time
+from typing import Any, Literal
 
 import geopandas as gpd
 import numpy as np
 import pandas as pd
+import shapely
+from shapely.errors import GEOSException
 
-from stlor.constants import NAD_83_CONUS_ALBERS, SQUARE_METERS_PER_ACRE, WGS_84
+from stlor.constants import SQUARE_METERS_PER_ACRE
+from stlor.output import read_gdf, write_gdf_to_disk
+from stlor.reservations import load_reservations
+from stlor.scheduler import TaskTiming, log_timings
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# The rights types aggregated separately, in column order.
+RIGHTS_TYPES: list[Literal["surface", "subsurface"]] = ["surface", "subsurface"]
 
-def dissolve_by_reservation_name(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
-    """Dissolve STLs by reservation name and compute aggregates on trust_name,
-    rights_type, gis_acres, and clipped_acres.
+
+def join_unique(df: pd.DataFrame, by: str, column: str) -> pd.Series:
+    """Join the unique values of a column within each group, in order of first
+    appearance, e.g. "State Schools, Public Buildings".
 
     Arguments:
-    stl_gdf {gpd.GeoDataFrame} -- the state trust land GeoDataFrame
+    df {pd.DataFrame} -- the DataFrame
+    by {str} -- the column to group by
+    column {str} -- the column whose unique values to join
 
     Returns:
-    gpd.GeoDataFrame -- the state trust land GeoDataFrame dissolved by
-    reservation_name
+    pd.Series -- the joined values, indexed by group
     """
-    agg_funcs = {
-        "reservation_name": "first",
-        "state": "first",
-        "trust_name": lambda trust: ", ".join(trust.unique()),
-        "rights_type": lambda rights: ", ".join(rights.unique()),
-        "object_id": "count",  # Use object_id as a unique field to count parcels.
-    }
+    return (
+        df[[by, column]].drop_duplicates().groupby(by, sort=True)[column].agg(", ".join)
+    )
 
-    return gdf.dissolve(by="reservation_name", aggfunc=agg_funcs).reset_index(drop=True)
 
+# How union_geometries merged a group of geometries:
+#   - "coverage" merged a valid coverage, i.e. polygons whose interiors don't
+#     overlap and whose shared edges have the same vertices, by dropping their
+#     shared edges.
+#   - "union" ran a general union, for overlapping or incorrectly noded groups.
+UnionMethod = Literal["coverage", "union"]
 
-def filter_by_rights_type(
-    stl_gdf: gpd.GeoDataFrame,
-    rights_type: Literal[
-        "surface",
-        "subsurface",
-    ],
-) -> gpd.GeoDataFrame:
-    """Filter the state trust land GeoDataFrame by rights_type.
 
-    Arguments:
-    stl_gdf {gpd.GeoDataFrame} -- the state trust land GeoDataFrame
-    rights_type {Literal["surface", "subsurface"]} --
-    the rights_type of parcels to filter by
+# The relative difference allowed between a coverage union's area and the sum
+# of its polygons' areas.
+COVERAGE_AREA_RTOL = 1e-9
 
-    Returns:
-    gpd.GeoDataFrame -- the state trust land GeoDataFrame filtered by
-    rights_type
-    """
-    return stl_gdf[stl_gdf["rights_type"].str.lower() == rights_type]
 
+def union_geometries(geometries: np.ndarray) -> tuple[Any, UnionMethod]:
+    """Union a group of polygons, using a coverage union where possible.
 
-def compute_area_by_rights_type(
-    gdf: gpd.GeoDataFrame,
-    rights_type: Literal[
-        "surface",
-        "subsurface",
-    ],
-) -> gpd.GeoDataFrame:
-    """Compute the area of parcels in the GeoDataFrame by rights_type.
+    Parcels within a reservation are mostly non-overlapping sections sharing
+    their edges, which a coverage union merges far faster than a general union.
+    A coverage union only drops the edges polygons share, so rather than
+    validating the coverage up front, which costs about as much as a general
+    union, its result is checked: GEOS rejects most overlapping or incorrectly
+    noded groups outright, and the rest yield an invalid result or one whose
+    area differs from the polygons' total area. Those groups fall back to the
+    general union.
 
     Arguments:
-    gdf {gpd.GeoDataFrame} -- the GeoDataFrame
-    rights_type {Literal["surface", "subsurface"]} -- the rights_type to use for
-    column renaming
+    geometries {np.ndarray} -- the polygons to union
 
     Returns:
-    gpd.GeoDataFrame -- the GeoDataFrame with rights_type acreage computed
+    tuple[Any, UnionMethod] -- the union of the polygons and how it was computed
     """
-    gdf[f"{rights_type}_acres"] = (gdf.area / SQUARE_METERS_PER_ACRE).round(2)
-
-    return gdf
-
-
-def subset_columns_by_rights_type(
-    gdf: gpd.GeoDataFrame,
-    rights_type: Literal["surface", "subsurface"],
-) -> gpd.GeoDataFrame:
-    """Subset a GeoDataFrame by rights_type-specific columns.
+    geometries = geometries[~shapely.is_missing(geometries)]
+    if len(geometries) == 1:
+        return geometries[0], "coverage"
+
+    try:
+        merged = shapely.coverage_union_all(geometries)
+    except GEOSException:
+        merged = None
+
+    if (
+        merged is not None
+        and shapely.is_valid(merged)
+        and np.isclose(
+            shapely.area(merged),
+            shapely.area(geometries).sum(),
+            rtol=COVERAGE_AREA_RTOL,
+            atol=0,
+        )
+    ):
+        return merged, "coverage"
+
+    return shapely.union_all(geometries), "union"
+
+
+def dissolve_geometries(
+    geometries: gpd.GeoSeries, by: Any
+) -> tuple[gpd.GeoSeries, list[TaskTiming]]:
+    """Union geometries by group, timing each group's union.
 
     Arguments:
-    gdf {gpd.GeoDataFrame} -- the GeoDataFrame
-    rights_type {Literal["surface", "subsurface"]} --
-    the rights_type to use for column subsetting
+    geometries {gpd.GeoSeries} -- the geometries to dissolve
+    by {Any} -- the groupby key(s), e.g. a Series or list of Series
 
     Returns:
-    gpd.GeoDataFrame -- the GeoDataFrame subsetted by rights_type-specific equi-
-    valents
+    tuple[gpd.GeoSeries, list[TaskTiming]] -- the union of each group, indexed
+    by group, and the timing of each group's union, keyed by (group, method)
     """
-    return gdf[
-        [
-            "reservation_name",
-            f"{rights_type}_acres",
-            "object_id",
-            "geometry",
-        ]
-    ]
+    grouped = geometries.groupby(by, sort=True)
+
+    merged = []
+    timings = []
+    for key, group in grouped:
+        start = time.perf_counter()
+        geometry, method = union_geometries(group.to_numpy())
+        timings.append(TaskTiming((key, method), time.perf_counter() - start))
+        merged.append(geometry)
+
+    return (
+        gpd.GeoSeries(merged, index=grouped.size().index, crs=geometries.crs),
+        timings,
+    )
+
 
+def union_by_rights_type(
+    stl_gdf: gpd.GeoDataFrame,
+) -> tuple[gpd.GeoSeries, list[TaskTiming]]:
+    """Union the parcels of each reservation by rights_type.
 
-def add_parcel_count(gdf: gpd.GeoDataFrame, rights_type=None) -> gpd.GeoDataFrame:
-    """Add a count column to a GeoDataFrame, using a rights_type-specific prefix
-    if provided.
+    This is the only pass that unions parcel geometries: every parcel is unioned
+    exactly once, with the other parcels of its reservation and rights_type.
 
     Arguments:
-    gdf {gpd.GeoDataFrame} -- the GeoDataFrame
-    rights_type {str} -- the rights_type to use for column prefix naming
+    stl_gdf {gpd.GeoDataFrame} -- the state trust land GeoDataFrame
 
     Returns:
-    gpd.GeoDataFrame -- the GeoDataFrame with a count column added
+    tuple[gpd.GeoSeries, list[TaskTiming]] -- the union of each reservation's
+    parcels, indexed by (reservation_name, rights_type), with rights_type
+    lowercased and "" for parcels without a rights_type, and the timing of each
+    union
     """
-    prefix = f"{rights_type}_" if rights_type else ""
-    gdf[f"{prefix}parcel_count"] = gdf["object_id"]
-    gdf = gdf.drop(columns="object_id")
+    rights_type = stl_gdf["rights_type"].str.lower().fillna("")
+
+    return dissolve_geometries(
+        stl_gdf.geometry, [stl_gdf["reservation_name"], rights_type]
+    )
 
-    return gdf
 
+def aggregate_by_reservation(stl_gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """Aggregate STLs by reservation name, computing the overall shape, the
+    trust_names and rights_types present, and the parcel count of each
+    reservation, alongside the acreage and parcel count of each rights_type.
 
-def compute_rights_type_aggregate_gdf(
-    stl_gdf: gpd.GeoDataFrame, rights_type: Literal["surface", "subsurface"]
-) -> gpd.GeoDataFrame:
-    """Compute aggregate statistics for the state trust lands GeoDataFrame based
-    on rights_type.
+    Acreages are those of the union of each reservation's parcels of a
+    rights_type, so overlapping parcels are only counted once.
 
     Arguments:
-    gdf {gpd.GeoDataFrame} -- the state trust lands GeoDataFrame
-    rights_type {Literal["surface", "subsurface"]} -- the rights_type to use for
-    column naming
+    stl_gdf {gpd.GeoDataFrame} -- the state trust land GeoDataFrame
 
     Returns:
-    gpd.GeoDataFrame -- the GeoDataFrame with aggregates computed on gis_acres
-    and clipped_acres
+    gpd.GeoDataFrame -- the aggregates, with one row per reservation_name
     """
-    gdf = filter_by_rights_type(stl_gdf, rights_type)
-    gdf = dissolve_by_reservation_name(gdf)
-    gdf = compute_area_by_rights_type(gdf, rights_type)
-    gdf = subset_columns_by_rights_type(gdf, rights_type)
-    gdf = add_parcel_count(gdf, rights_type)
+    stl_gdf = stl_gdf[stl_gdf["reservation_name"].notna()]
+
+    # Aggregate attributes in a single groupby over all parcels.
+    grouped = stl_gdf.groupby("reservation_name", sort=True)
+    agg_df = pd.DataFrame(
+        {
+            "reservation_name": grouped["reservation_name"].first(),
+            "state": grouped["state"].first(),
+            "trust_name": join_unique(stl_gdf, "reservation_name", "trust_name"),
+            "rights_type": join_unique(stl_gdf, "reservation_name", "rights_type"),
+            # Use object_id as a unique field to count parcels.
+            "parcel_count": grouped["object_id"].count(),
+        }
+    )
 
-    return gdf
+    # Union parcels by rights_type, then merge the (few) rights_type shapes of
+    # each reservation into its overall shape.
+    rights_type_shapes, timings = union_by_rights_type(stl_gdf)
+    shapes, shape_timings = dissolve_geometries(
+        rights_type_shapes,
+        rights_type_shapes.index.get_level_values("reservation_name"),
+    )
+    logger.info("Slowest reservation unions:")
+    log_timings(timings + shape_timings)
+
+    rights_type = stl_gdf["rights_type"].str.lower()
+    for rights_type_name in RIGHTS_TYPES:
+        rights_type_shape = rights_type_shapes[
+            rights_type_shapes.index.get_level_values(1) == rights_type_name
+        ].droplevel(1)
+        acres = pd.Series(
+            (shapely.area(rights_type_shape.to_numpy()) / SQUARE_METERS_PER_ACRE),
+            index=rights_type_shape.index,
+        ).round(2)
+        counts = (
+            stl_gdf.loc[rights_type == rights_type_name]
+            .groupby("reservation_name")["object_id"]
+            .count()
+        )
+        agg_df[f"{rights_type_name}_acres"] = acres.reindex(
+            agg_df.index, fill_value=0
+        ).astype(float)
+        agg_df[f"{rights_type_name}_parcel_count"] = counts.reindex(
+            agg_df.index, fill_value=0
+        ).astype(int)
+
+    # Compute total acres by summing surface and subsurface acres.
+    agg_df["total_acres"] = agg_df["surface_acres"] + agg_df["subsurface_acres"]
+
+    return gpd.GeoDataFrame(
+        agg_df.reset_index(drop=True),
+        geometry=shapes.reindex(agg_df.index).to_numpy(),
+        crs=stl_gdf.crs,
+    )[["geometry", *agg_df.columns]]
 
 
 def compute_reservation_area() -> pd.DataFrame:
@@ -150,16 +222,10 @@ def compute_reservation_area() -> pd.DataFrame:
     Returns:
     pd.DataFrame -- a DataFrame containing reservation names and areas, in acres
     """
-    bia_aian_gdf = gpd.read_file(
-        Path("public_data/00_Reservation Layer/BIA_AIAN+OK_Fixed.geojson").resolve()
-    ).to_crs(NAD_83_CONUS_ALBERS)
-    bia_aian_supplemental_gdf = gpd.read_file(
-        Path("public_data/00_Reservation Layer/BIA_Supplemental.geojson").resolve()
-    ).to_crs(NAD_83_CONUS_ALBERS)
-
-    # Union the two GeoDataFrames, pulling the reservation_name from LARNAME for
-    # the primary layer and LANDAREA for the supplemental layer.
-    reservations_gdf = bia_aian_gdf.overlay(bia_aian_supplemental_gdf, how="union")
+    # The union of the primary and supplemental layers carries the
+    # reservation_name in LARNAME for the primary layer and LANDAREA for the
+    # supplemental layer.
+    reservations_gdf = load_reservations().gdf
     reservations_gdf["reservation_name"] = np.where(
         reservations_gdf["LARNAME"].notnull(),
         reservations_gdf["LARNAME"],
@@ -169,14 +235,19 @@ def compute_reservation_area() -> pd.DataFrame:
     # Dissolve by reservation_name. Some reservations have multiple associated
     # polygons–from the primary layer and the Tribal Statistical Areas layer,
     # respectively—so dissolve ensures we return a single record per tribe.
-    reservations_gdf = reservations_gdf.dissolve(
-        by="reservation_name", aggfunc={"reservation_name": "first"}
-    ).reset_index(drop=True)
-    reservations_gdf["reservation_acres"] = (
-        reservations_gdf.area / SQUARE_METERS_PER_ACRE
-    ).round(2)
+    shapes, timings = dissolve_geometries(
+        reservations_gdf.geometry, reservations_gdf["reservation_name"]
+    )
+    logger.info("Slowest reservation dissolves:")
+    log_timings(timings)
+
     reservations_df = pd.DataFrame(
-        reservations_gdf[["reservation_name", "reservation_acres"]]
+        {
+            "reservation_name": shapes.index,
+            "reservation_acres": (shapes.area / SQUARE_METERS_PER_ACRE)
+            .round(2)
+            .to_numpy(),
+        }
     )
 
     return reservations_df
@@ -184,56 +255,15 @@ def compute_reservation_area() -> pd.DataFrame:
 
 def main():
     logger.info("Aggregating STLs by reservation.")
-    stl_gdf = gpd.read_file(
+    stl_gdf = read_gdf(
         Path(
             "public_data/04_All States/06_All-STLs-on-Reservations-Final.geojson"
         ).resolve()
     )
 
-    reservations_agg_gdf = dissolve_by_reservation_name(stl_gdf)
+    reservations_agg_gdf = aggregate_by_reservation(stl_gdf)
     logger.info(f"Reservations with STLs count: {len(reservations_agg_gdf)}")
 
-    reservations_agg_gdf = add_parcel_count(reservations_agg_gdf)
-
-    # Compute aggregates for surface and subsurface rights.
-    logger.info(
-        "Computing aggregates for surface and subsurface parcels by reservation."
-    )
-    surface_reservations_agg_gdf = compute_rights_type_aggregate_gdf(stl_gdf, "surface")
-    subsurface_reservations_agg_gdf = compute_rights_type_aggregate_gdf(
-        stl_gdf, "subsurface"
-    )
-
-    # Join all aggregates.
-    logger.info("Joining aggregates by reservation.")
-    reservations_agg_gdf = reservations_agg_gdf.merge(
-        pd.DataFrame(surface_reservations_agg_gdf.drop(columns="geometry")),
-        on="reservation_name",
-        how="left",
-    )
-    reservations_agg_gdf = reservations_agg_gdf.fillna(
-        value={
-            "surface_acres": 0,
-            "surface_parcel_count": 0,
-        }
-    ).astype({"surface_parcel_count": int})
-    reservations_agg_gdf = reservations_agg_gdf.merge(
-        pd.DataFrame(subsurface_reservations_agg_gdf.drop(columns="geometry")),
-        on="reservation_name",
-        how="left",
-    )
-    reservations_agg_gdf = reservations_agg_gdf.fillna(
-        value={
-            "subsurface_acres": 0,
-            "subsurface_parcel_count": 0,
-        }
-    ).astype({"subsurface_parcel_count": int})
-
-    # Compute total acres by summing surface and subsurface acres.
-    reservations_agg_gdf["total_acres"] = (
-        reservations_agg_gdf["surface_acres"] + reservations_agg_gdf["subsurface_acres"]
-    )
-
     # Join data on reservation area.
     reservations_agg_gdf = reservations_agg_gdf.merge(
         compute_reservation_area(), on="reservation_name", how="left"
@@ -241,16 +271,11 @@ def main():
 
     # Save to file.
     logger.info(
-        "Writing aggregations to 05_Final-Dataset/01_STLs-on-Reservations-by-Reservation.{geojson,csv,xlsx}"
+        "Writing aggregations to 05_Final-Dataset/01_STLs-on-Reservations-by-Reservation.{parquet,fgb,geojson,csv,xlsx}"
     )
     output_dir = Path("public_data/05_Final-Dataset/").resolve()
     filename = "01_STLs-on-Reservations-by-Reservation"
-    reservations_agg_gdf.to_file(output_dir / f"{filename}.geojson", driver="GeoJSON")
-    reservations_agg_gdf.to_crs(WGS_84).to_file(
-        output_dir / f"{filename}_WGS84.geojson", driver="GeoJSON"
-    )
-    reservations_agg_gdf.to_csv(output_dir / f"{filename}.csv", index=False)
-    reservations_agg_gdf.to_excel(output_dir / f"{filename}.xlsx", index=False)
+    write_gdf_to_disk(reservations_agg_gdf, output_dir, filename)
 
     logger.info("Completed aggregation of STLs by reservation.")
 
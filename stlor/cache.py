@@ -0,0 +1,229 @@
+from contextlib import contextmanager
+import hashlib
+import logging
+import os
+from pathlib import Path
+import tempfile
+import threading
+from typing import Any, Iterable, Iterator, Optional
+
+import geopandas as gpd
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# The default location of cached GeoParquet snapshots of activity layers.
+ACTIVITY_CACHE_DIR = Path("data/.cache/stl_activity_layers")
+
+# The number of bytes read at a time when hashing a file.
+HASH_CHUNK_SIZE = 1 << 20
+
+# A lock per snapshot path, so threads building the same snapshot (e.g. two
+# activity sources reading the same layer) build it once, one after another.
+_snapshot_locks: dict[Path, threading.Lock] = {}
+_snapshot_locks_lock = threading.Lock()
+
+
+def source_files(path: Path) -> list[Path]:
+    """List the files that make up a vector data source.
+
+    A shapefile is stored as several sidecar files sharing the .shp file's
+    stem (.shx, .dbf, .prj, .cpg, ...), all of which affect its contents. A
+    directory source is made up of every file beneath it.
+
+    Arguments:
+    path -- the path to the data source
+
+    Returns:
+    list[Path] -- the data source's files, in a stable order
+    """
+    if path.is_dir():
+        return sorted(p for p in path.rglob("*") if p.is_file())
+
+    if path.suffix.lower() == ".shp":
+        return sorted(
+            p
+            for p in path.parent.glob(f"{path.stem}.*")
+            if p.is_file() and p.stem == path.stem
+        )
+
+    return [path]
+
+
+def hash_files(paths: Iterable[Path]) -> str:
+    """Compute a hash over the names and contents of a set of files.
+
+    Arguments:
+    paths -- the files to hash
+
+    Returns:
+    str -- the hex digest of the files' names and contents
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(path.name.encode())
+        with open(path, "rb") as f:
+            while chunk := f.read(HASH_CHUNK_SIZE):
+                digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def cache_key(source: Path, columns: Optional[list[str]], crs: Any) -> str:
+    """Compute the cache key of a data source read with a set of columns and
+    projected to a CRS.
+
+    Arguments:
+    source -- the path to the data source
+    columns -- the columns read from the data source, or None for all columns
+    crs -- the CRS the data source is projected to
+
+    Returns:
+    str -- the cache key
+    """
+    digest = hashlib.sha256()
+    digest.update(hash_files(source_files(source)).encode())
+    digest.update(repr(sorted(columns) if columns is not None else None).encode())
+    digest.update(gpd.GeoSeries(crs=crs).crs.to_wkt().encode())
+
+    return digest.hexdigest()[:16]
+
+
+def cache_path(cache_dir: Path, location: str, key: str) -> Path:
+    """Determine where a data source's snapshot is cached.
+
+    Arguments:
+    cache_dir -- the cache directory
+    location -- the data source's location, relative to its data directory
+    key -- the snapshot's cache key
+
+    Returns:
+    Path -- the path to the cached GeoParquet snapshot
+    """
+    return cache_dir / f"{cache_prefix(location)}{key}.parquet"
+
+
+def cache_prefix(location: str) -> str:
+    """Derive a flat file name prefix from a data source's location."""
+    return location.replace("/", "__").replace(" ", "_") + "-"
+
+
+@contextmanager
+def snapshot_lock(path: Path) -> Iterator[None]:
+    """Hold the lock of a snapshot path, serializing threads that check for
+    and build the same snapshot.
+
+    Arguments:
+    path -- the path to the snapshot
+    """
+    with _snapshot_locks_lock:
+        lock = _snapshot_locks.setdefault(path, threading.Lock())
+
+    with lock:
+        yield
+
+
+def stale_snapshots(cache_dir: Path, location: str, path: Path) -> list[Path]:
+    """List the snapshots of a location other than its current one.
+
+    Only files named for the location followed by a bare cache key are
+    matched, so the snapshots of locations that share a prefix (e.g. "A" and
+    "A-B") are left alone.
+
+    Arguments:
+    cache_dir -- the cache directory
+    location -- the snapshot's location
+    path -- the path to the current snapshot
+
+    Returns:
+    list[Path] -- the paths to the location's stale snapshots
+    """
+    prefix = cache_prefix(location)
+
+    return [
+        stale
+        for stale in cache_dir.glob(f"{prefix}*.parquet")
+        if stale != path and stale.name[len(prefix) : -len(".parquet")].isalnum()
+    ]
+
+
+def write_snapshot(
+    gdf: pd.DataFrame, cache_dir: Path, location: str, path: Path
+) -> None:
+    """Write a (Geo)Parquet snapshot to the cache, replacing any stale snapshots
+    of the same location.
+
+    Arguments:
+    gdf -- the GeoDataFrame, or DataFrame, to snapshot
+    cache_dir -- the cache directory
+    location -- the snapshot's location, used to find stale snapshots
+    path -- the path to write the snapshot to
+
+    Returns:
+    None
+
+    Side effects:
+    Writes the snapshot to path, then deletes the other snapshots of location
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    # Write to a uniquely named temporary file first so a concurrent or
+    # interrupted write never leaves, or reads, a partial snapshot.
+    fd, tmp_name = tempfile.mkstemp(
+        dir=cache_dir, prefix=f"{path.name}.", suffix=".tmp"
+    )
+    os.close(fd)
+    tmp_path = Path(tmp_name)
+    try:
+        if isinstance(gdf, gpd.GeoDataFrame):
+            gdf.to_parquet(tmp_path, write_covering_bbox=True)
+        else:
+            gdf.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+    for stale in stale_snapshots(cache_dir, location, path):
+        stale.unlink(missing_ok=True)
+
+
+def read_projected_layer(
+    source: Path,
+    location: str,
+    crs: Any,
+    columns: Optional[list[str]] = None,
+    bbox: Optional[tuple[float, float, float, float]] = None,
+    cache_dir: Path = ACTIVITY_CACHE_DIR,
+) -> gpd.GeoDataFrame:
+    """Read a data source projected to a CRS, through a GeoParquet cache.
+
+    On a cache miss, the data source is read, projected, and written to the
+    cache, replacing any stale snapshots of the same source. Snapshots are read
+    back memory-mapped, and filtered to a bounding box using their covering
+    bbox column.
+
+    Arguments:
+    source -- the path to the data source
+    location -- the data source's location, used to name its snapshots
+    crs -- the CRS to project the data source to
+    columns -- the columns to read, or None for all columns
+    bbox -- an optional bounding box, in crs, that features must intersect
+    cache_dir -- the cache directory
+
+    Returns:
+    gpd.GeoDataFrame -- the projected data source
+    """
+    key = cache_key(source, columns, crs)
+    path = cache_path(cache_dir, location, key)
+
+    with snapshot_lock(path):
+        if not path.exists():
+            logger.info(f"Caching {location} as {path.name}")
+            gdf = gpd.read_file(
+                source, engine="pyogrio", use_arrow=True, columns=columns
+            ).to_crs(crs)
+
+            write_snapshot(gdf, cache_dir, location, path)
+
+    return gpd.read_parquet(path, bbox=bbox, memory_map=True)
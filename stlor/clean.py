@@ -1,8 +1,17 @@
+import functools
+
 import geopandas as gpd
-from typing import Dict, Literal
+import pandas as pd
+from typing import Dict, Iterable, Literal
 
-from stlor.activity import concatenate_activity_info
-from stlor.constants import RIGHTS_TYPE, ACTIVITY_INFO, ACTIVITY_INFO_2
+from stlor.activity import concatenate_activity_info_columns
+from stlor.constants import (
+    RIGHTS_TYPE,
+    ACTIVITY_INFO,
+    ACTIVITY_INFO_2,
+    STATE,
+    TRUST_NAME,
+)
 
 
 def remove_river_slivers(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
@@ -83,7 +92,9 @@ def join_activity_info(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
     gpd.GeoDataFrame -- the state trust lands GeoDataFrame with a cleaned
     activity_info column
     """
-    gdf[ACTIVITY_INFO] = gdf.apply(concatenate_activity_info, axis=1)
+    gdf[ACTIVITY_INFO] = concatenate_activity_info_columns(
+        gdf[ACTIVITY_INFO], gdf[ACTIVITY_INFO_2]
+    )
     gdf = gdf.drop(ACTIVITY_INFO_2, axis=1)
 
     return gdf
@@ -141,6 +152,85 @@ def pascal_case(
     return " ".join(pascal_words)
 
 
+# The keywords pascal_case keeps in lower- or uppercase in each state's trust
+# names. Only the trust names of these states are normalized.
+TRUST_NAME_KEYWORDS: Dict[str, Dict[str, Literal["upper"] | Literal["lower"]]] = {
+    "ND": {"of": "lower", "the": "lower", "for": "lower", "nd": "upper"},
+    "MN": {},
+    "AZ": {"of": "lower"},
+}
+
+
+@functools.lru_cache(maxsize=None)
+def normalize_trust_name(state: str, trust_name: str) -> str:
+    """
+    Normalize a single trust name for display.
+
+    Trust names in the states of TRUST_NAME_KEYWORDS are converted to
+    PascalCase with their keywords. In North Dakota, "ÔøΩ" is first replaced
+    with a space, and "Bank of North Dakota" is renamed to "Strategic Investment
+    and Improvement Fund". Other states' trust names are returned unchanged.
+
+    Arguments:
+    state -- the parcel's state abbreviation
+    trust_name -- the trust name to normalize
+
+    Returns:
+    str -- the normalized trust name
+    """
+    if state not in TRUST_NAME_KEYWORDS:
+        return trust_name
+
+    if state == "ND":
+        trust_name = trust_name.replace("ÔøΩ", " ")
+
+    trust_name = pascal_case(trust_name, TRUST_NAME_KEYWORDS[state])
+
+    if state == "ND" and trust_name == "Bank of North Dakota":
+        return "Strategic Investment and Improvement Fund"
+
+    return trust_name
+
+
+def normalize_trust_names(
+    gdf: gpd.GeoDataFrame, states: Iterable[str] = TRUST_NAME_KEYWORDS
+) -> gpd.GeoDataFrame:
+    """
+    Normalize the trust names of parcels in a set of states in a single pass.
+
+    Each distinct (state, trust_name) pair is normalized once, and the results
+    are mapped back to parcels through the codes of a categorical column.
+
+    Arguments:
+    gdf -- the state trust lands GeoDataFrame
+    states -- the states whose trust names to normalize
+
+    Returns:
+    gpd.GeoDataFrame -- the state trust lands GeoDataFrame with normalized trust
+    names, stored as a categorical column
+    """
+    states = set(states)
+    grouped = gdf.groupby([STATE, TRUST_NAME], sort=False, dropna=False, observed=True)
+    keys = grouped.ngroup().to_numpy()
+
+    trust_names = pd.Categorical(
+        [
+            normalize_trust_name(state, trust_name)
+            if state in states and not pd.isna(trust_name)
+            else trust_name
+            for state, trust_name in grouped.size().index
+        ]
+    )
+
+    return gdf.assign(
+        **{
+            TRUST_NAME: pd.Categorical.from_codes(
+                trust_names.codes[keys], trust_names.categories
+            )
+        }
+    )
+
+
 def fix_nd_trust_names(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
     """
     Fix up trust names for parcels in North Dakota.
@@ -158,24 +248,7 @@ def fix_nd_trust_names(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
     gpd.GeoDataFrame -- the state trust lands GeoDataFrame with corrected trust
     names for parcels in North Dakota
     """
-    mask = gdf["state"] == "ND"
-
-    # Replace "ÔøΩ" with an empty string in the 'trust_name' column.
-    gdf.loc[mask, "trust_name"] = gdf.loc[mask, "trust_name"].str.replace("ÔøΩ", " ")
-
-    # Pascal case the trust names.
-    gdf.loc[mask, "trust_name"] = gdf.loc[mask, "trust_name"].apply(
-        lambda x: pascal_case(
-            x, {"of": "lower", "the": "lower", "for": "lower", "nd": "upper"}
-        )
-    )
-
-    # Change "Bank of North Dakota" to "Strategic Investment and Improvement Fund".
-    gdf.loc[mask & (gdf["trust_name"] == "Bank of North Dakota"), "trust_name"] = (
-        "Strategic Investment and Improvement Fund"
-    )
-
-    return gdf
+    return normalize_trust_names(gdf, ["ND"])
 
 
 def fix_mn_trust_names(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
@@ -189,14 +262,7 @@ def fix_mn_trust_names(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
     gpd.GeoDataFrame -- the state trust lands GeoDataFrame with corrected trust
     names for parcels in Minnesota
     """
-    mask = gdf["state"] == "MN"
-
-    # Pascal case the trust names.
-    gdf.loc[mask, "trust_name"] = gdf.loc[mask, "trust_name"].apply(
-        lambda x: pascal_case(x)
-    )
-
-    return gdf
+    return normalize_trust_names(gdf, ["MN"])
 
 
 def fix_az_trust_names(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
@@ -210,14 +276,7 @@ def fix_az_trust_names(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
     gpd.GeoDataFrame -- the state trust lands GeoDataFrame with corrected trust
     names for parcels in North Dakota
     """
-    mask = gdf["state"] == "AZ"
-
-    # Pascal case the trust names.
-    gdf.loc[mask, "trust_name"] = gdf.loc[mask, "trust_name"].apply(
-        lambda x: pascal_case(x, {"of": "lower"})
-    )
-
-    return gdf
+    return normalize_trust_names(gdf, ["AZ"])
 
 
 def filter_id_trust_names(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
@@ -317,8 +376,4 @@ def fix_trust_names(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
     gpd.GeoDataFrame -- the state trust lands GeoDataFrame with corrected trust
     names for parcels in all states
     """
-    gdf = fix_nd_trust_names(gdf)
-    gdf = fix_mn_trust_names(gdf)
-    gdf = fix_az_trust_names(gdf)
-
-    return gdf
+    return normalize_trust_names(gdf)
@@ -1,7 +1,9 @@
+from functools import partial
 import logging
-from pathlib import Path
 
 import geopandas as gpd
+import numpy as np
+import shapely
 
 from stlor.constants import (
     NAD_83_CONUS_ALBERS,
@@ -10,40 +12,193 @@ from stlor.constants import (
     STATE,
     RESERVATION_NAME,
 )
+from stlor.reservations import ReservationLayer, load_reservations
+from stlor.utils import in_parallel
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# The number of parcels clipped together in a single task.
+CLIP_CHUNK_SIZE = 5_000
 
-def clip_to_reservation_boundaries(stl_gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+
+def classify_parcels(
+    geometries: np.ndarray, polygons: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Classify parcels against the reservation footprint's polygons.
+
+    Candidate (parcel, polygon) pairs come from an STRtree over the polygons
+    and are tested in bulk with the polygons first, so GEOS evaluates them
+    against the prepared polygons.
+
+    Arguments:
+    geometries -- the parcel geometries
+    polygons -- the prepared footprint polygons to classify parcels against
+
+    Returns:
+    tuple[np.ndarray, np.ndarray, np.ndarray] -- the positions of parcels
+    covered by a single footprint polygon, and the parcel and footprint polygon
+    positions of every intersecting pair whose parcel is not
+    """
+    parcel_idx, polygon_idx = shapely.STRtree(polygons).query(geometries)
+    candidates = polygons.take(polygon_idx)
+    parcel_geometries = geometries.take(parcel_idx)
+
+    intersects = shapely.intersects(candidates, parcel_geometries)
+    polygon_idx = polygon_idx[intersects]
+    parcel_idx = parcel_idx[intersects]
+
+    covered = shapely.covers(candidates[intersects], parcel_geometries[intersects])
+    inside = np.unique(parcel_idx[covered])
+    straddling = ~np.isin(parcel_idx, inside)
+
+    return inside, parcel_idx[straddling], polygon_idx[straddling]
+
+
+def clip_parcels(
+    geometries: np.ndarray, polygons: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Clip parcels to the reservation footprint.
+
+    Parcels fully inside a footprint polygon are kept unchanged and parcels
+    that don't intersect any are dropped. Only parcels straddling a reservation
+    boundary are intersected, with each footprint polygon they intersect, and
+    the pieces unioned, which clips them as intersecting them with the union of
+    the whole layer would.
+
+    Arguments:
+    geometries -- the parcel geometries
+    polygons -- the prepared footprint polygons to clip parcels to
+
+    Returns:
+    tuple[np.ndarray, np.ndarray] -- the positions of the parcels that
+    intersect a reservation, in ascending order, and their clipped geometries
+    """
+    inside, parcel_idx, polygon_idx = classify_parcels(geometries, polygons)
+
+    # Intersect each straddling parcel with every footprint polygon it
+    # intersects, then union its (small) pieces back together.
+    order = np.argsort(parcel_idx, kind="stable")
+    parcel_idx, polygon_idx = parcel_idx[order], polygon_idx[order]
+    pieces = shapely.intersection(
+        geometries.take(parcel_idx),
+        polygons.take(polygon_idx),
+    )
+    straddling, starts = np.unique(parcel_idx, return_index=True)
+    clipped_straddling = np.array(
+        [
+            group[0] if len(group) == 1 else shapely.union_all(group)
+            for group in np.split(pieces, starts[1:])
+            if len(group)
+        ],
+        dtype=object,
+    )
+
+    positions = np.concatenate([inside, straddling])
+    clipped = np.concatenate([geometries.take(inside), clipped_straddling])
+    order = np.argsort(positions, kind="stable")
+
+    return positions[order], clipped[order]
+
+
+def chunk_parcels(geometries: np.ndarray, chunk_size: int) -> list[np.ndarray]:
+    """Split parcels into spatially coherent chunks.
+
+    Parcels are ordered along a Hilbert curve over their extent, so each chunk
+    covers a compact area and overlaps few reservations. Missing and empty
+    geometries, which can't intersect a reservation, are left out.
+
+    Arguments:
+    geometries -- the parcel geometries
+    chunk_size -- the maximum number of parcels in a chunk
+
+    Returns:
+    list[np.ndarray] -- the positions of the parcels in each chunk
+    """
+    positions = np.flatnonzero(
+        ~shapely.is_missing(geometries) & ~shapely.is_empty(geometries)
+    )
+    if not len(positions):
+        return []
+
+    distances = gpd.GeoSeries(geometries.take(positions)).hilbert_distance()
+    positions = positions[np.argsort(distances.to_numpy(), kind="stable")]
+
+    return [
+        positions[start : start + chunk_size]
+        for start in range(0, len(positions), chunk_size)
+    ]
+
+
+def clip_chunk(
+    positions: np.ndarray, geometries: np.ndarray, reservations: ReservationLayer
+) -> tuple[np.ndarray, np.ndarray]:
+    """Clip a chunk of parcels to the footprint polygons within its extent.
+
+    Arguments:
+    positions -- the positions of the chunk's parcels
+    geometries -- the geometries of all parcels
+    reservations -- the reservation layer
+
+    Returns:
+    tuple[np.ndarray, np.ndarray] -- the positions of the chunk's parcels that
+    intersect a reservation, in ascending order, and their clipped geometries
+    """
+    chunk = geometries.take(positions)
+    extent = shapely.box(*shapely.total_bounds(chunk))
+    polygon_idx = np.sort(reservations.footprint_tree.query(extent))
+
+    # GEOS builds a prepared geometry's indexes lazily, on first use, so the
+    # layer's prepared polygons can't safely be shared between workers. Each
+    # chunk prepares its own copies of the few polygons near it instead.
+    polygons = shapely.from_wkb(
+        shapely.to_wkb(reservations.footprint.take(polygon_idx))
+    )
+    shapely.prepare(polygons)
+
+    kept, clipped = clip_parcels(chunk, polygons)
+
+    return positions[kept], clipped
+
+
+def clip_to_reservation_boundaries(
+    stl_gdf: gpd.GeoDataFrame, chunk_size: int = CLIP_CHUNK_SIZE
+) -> gpd.GeoDataFrame:
     """Clip state trust lands to reservation boundaries.
 
+    Parcels are clipped in spatially coherent chunks, in parallel, and the
+    clipped parcels are returned in their original order.
+
     Arguments:
     stl_gdf -- the state trust lands GeoDataFrame
+    chunk_size -- the maximum number of parcels clipped in a single task
 
     Returns:
     gpd.GeoDataFrame -- the clipped state trust lands GeoDataFrame
     """
-    reservations_gdf = gpd.read_file(
-        Path("public_data/00_Reservation Layer/BIA_AIAN+OK_Fixed.geojson").resolve()
-    )
-    supp_reservations_gdf = gpd.read_file(
-        Path("public_data/00_Reservation Layer/BIA_Supplemental.geojson").resolve()
-    )
+    reservations = load_reservations()
 
-    # Reproject all GeoDataFrames to NAD83 Conus Albers.
-    logger.info("Reprojecting STL and BIA_AIAN GeoDataFrames to NAD83 Conus Albers.")
+    # Reproject the state trust lands to NAD83 Conus Albers, the reservation
+    # layer's CRS.
+    logger.info("Reprojecting STL GeoDataFrame to NAD83 Conus Albers.")
     stl_gdf = stl_gdf.to_crs(NAD_83_CONUS_ALBERS)
-    reservations_gdf = reservations_gdf.to_crs(NAD_83_CONUS_ALBERS)
-    supp_reservations_gdf = supp_reservations_gdf.to_crs(NAD_83_CONUS_ALBERS)
-
-    # Union the reservations_gdf and supp_reservations_gdf to a single layer in
-    # prepartion for the clipping operation.
-    logger.info("Unioning the BIA_AIAN primary and supplemental GeoDataFrames.")
-    reservations_gdf = reservations_gdf.overlay(supp_reservations_gdf, how="union")
 
     logger.info("Clipping the STL GeoDataFrame to reservation boundaries.")
-    stl_gdf = stl_gdf.clip(reservations_gdf)
+    geometries = np.asarray(stl_gdf.geometry.values)
+    chunks = in_parallel(
+        chunk_parcels(geometries, chunk_size),
+        partial(clip_chunk, geometries=geometries, reservations=reservations),
+        scheduler="threads",
+    )
+    positions = np.concatenate([np.empty(0, dtype=np.intp)] + [p for p, _ in chunks])
+    clipped = np.concatenate([np.empty(0, dtype=object)] + [g for _, g in chunks])
+    order = np.argsort(positions, kind="stable")
+    positions, clipped = positions[order], clipped[order]
+
+    stl_gdf = stl_gdf.iloc[positions].copy()
+    stl_gdf[stl_gdf.geometry.name] = gpd.GeoSeries(
+        clipped, index=stl_gdf.index, crs=stl_gdf.crs
+    )
 
     logger.info("Calculating the area of the clipped state trust lands.")
     stl_gdf[CLIPPED_ACRES] = (stl_gdf.area / SQUARE_METERS_PER_ACRE).round(2)
@@ -1158,6 +1158,12 @@ ACTIVITY_REWRITE_RULES = {
     },
 }
 
+ACTIVITY_NAME_REWRITES = {
+    "OtherMin": "Other Minerals",
+    "OilGas": "Oil & Gas",
+    "OilAndGas": "Oil & Gas",
+}
+
 ACTIVITY_RIGHTS_TYPE = {
     "Agriculture": "surface",
     "Grazing": "surface",
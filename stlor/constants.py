@@ -22,10 +22,21 @@ RIGHTS_TYPE_INFO = "rights_type_info"
 NET_ACRES = "net_acres"
 GIS_ACRES = "gis_acres"
 LAYER = "layer"
+LAYER_INDEX = "layer_index"
 LEASE_STATUS = "lease_status"
 LESSEE = "lessee"
 DATA_SOURCE = "data_source"
 
+# Match table columns
+ROW_IDX = "row_idx"
+ACTIVITY_NAME = "activity_name"
+MATCH_COLUMNS = [ROW_IDX, ACTIVITY_NAME, LAYER_INDEX, LEASE_STATUS, LESSEE]
+
+# Activity info table columns, and the fields of each entry in the order they
+# are rendered in the activity_info column
+ACTIVITY_INFO_FIELDS = [LAYER_INDEX, ACTIVITY, LEASE_STATUS, LESSEE]
+ACTIVITY_INFO_COLUMNS = [ROW_IDX, *ACTIVITY_INFO_FIELDS]
+
 # Column values
 SUBSURFACE_RIGHTS_TYPE = "subsurface"
 SURFACE_RIGHTS_TYPE = "surface"
@@ -1,9 +1,12 @@
 from dataclasses import dataclass, field
 import enum
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, List, Optional
 
 import geopandas as gpd
+import pyogrio
+
+from stlor.cache import ACTIVITY_CACHE_DIR, read_projected_layer
 
 
 class RightsType(enum.Enum):
@@ -23,10 +26,54 @@ class StateActivityDataSource:
     keep_cols: List[str] = field(default_factory=list)
     activity_name_appendage_col: Optional[str] = None
 
-    def query_data(self, activity_dir: Path) -> gpd.GeoDataFrame:
+    def list_columns(self, activity_dir: Path) -> List[str]:
+        loc_path = activity_dir / self.location
+
+        return list(pyogrio.read_info(loc_path)["fields"])
+
+    def query_data(
+        self,
+        activity_dir: Path,
+        columns: Optional[List[str]] = None,
+        bbox: Optional[gpd.GeoSeries] = None,
+        mask: Optional[gpd.GeoSeries] = None,
+    ) -> gpd.GeoDataFrame:
         loc_path = activity_dir / self.location
 
-        return gpd.read_file(loc_path)
+        # Read through pyogrio's Arrow reader, decoding only the requested
+        # columns and, given a bbox or mask, only the features that fall within
+        # it. A GeoSeries bbox or mask is reprojected to the layer's CRS.
+        return gpd.read_file(
+            loc_path,
+            engine="pyogrio",
+            use_arrow=True,
+            columns=columns,
+            bbox=bbox,
+            mask=mask,
+        )
+
+    def query_projected(
+        self,
+        activity_dir: Path,
+        crs: Any,
+        columns: Optional[List[str]] = None,
+        bbox: Optional[gpd.GeoSeries] = None,
+        cache_dir: Optional[Path] = ACTIVITY_CACHE_DIR,
+    ) -> gpd.GeoDataFrame:
+        # Serve the layer, already projected to crs, from a memory-mapped
+        # GeoParquet snapshot keyed by the source's content hash and columns.
+        # Passing cache_dir=None reads and projects the source directly.
+        if cache_dir is None:
+            return self.query_data(activity_dir, columns=columns, bbox=bbox).to_crs(crs)
+
+        return read_projected_layer(
+            activity_dir / self.location,
+            self.location,
+            crs,
+            columns=columns,
+            bbox=None if bbox is None else tuple(bbox.to_crs(crs).total_bounds),
+            cache_dir=cache_dir,
+        )
 
 
 @dataclass
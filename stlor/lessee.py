@@ -1,24 +1,22 @@
 import pandas as pd
 import re
 
+from stlor.activity import concatenate_activity_info_columns, render_activity_info
+from stlor.constants import LEASE_STATUS, LESSEE, ROW_IDX
 
-def parse_lessee(activity_info: str) -> str:
-    """
-    Parses the lessee information from the activity_info column.
-
-    Arguments:
-    activity_info -- The activity_info column value.
+# The separator between entries of an activity_info value: a newline followed
+# by the next entry's layer_index.
+ENTRY_SEPARATOR = re.compile(r"\n(?=layer_index:)")
 
-    Returns:
-    A string containing the lessee information.
-    """
-    if pd.isna(activity_info):
-        return ""
+# The lease status and lessee of an activity_info entry.
+LEASE_STATUS_PATTERN = re.compile(
+    r"lease_status:\s*(.+?)(?=\s+lessee:|$)", re.IGNORECASE
+)
+LESSEE_PATTERN = re.compile(r"lessee:\s*(.+?)(?=\n|$)", re.IGNORECASE)
 
-    activity_info = str(activity_info)
-    entries = re.split(r"\n(?=layer_index:)", activity_info.strip())
-    active_lessees = []
-    active_statuses = {
+# The lease statuses, lowercased, whose lessees are considered active.
+ACTIVE_STATUSES = frozenset(
+    {
         "active",
         "y",
         "20 years term",
@@ -39,23 +37,180 @@ def parse_lessee(activity_info: str) -> str:
         "identified gravel pit",
         "moderate potential for sand and gravel resources",
     }
+)
+
+# The start of an activity_info entry.
+ENTRY_START = "layer_index:"
+
+# Lessee names that stand for no lessee, lowercased.
+EMPTY_LESSEES = frozenset({"none", ""})
+
+
+def split_lessees(lessee: pd.Series) -> pd.Series:
+    """
+    Splits semicolon-delimited lessee values into individual, uppercased
+    lessees, dropping empty ones.
+
+    Arguments:
+    lessee -- The lessee values, keyed by any index.
+
+    Returns:
+    A long-form Series of lessees, keyed by the index of their value.
+    """
+    lessees = lessee.str.strip().str.split(";").explode().str.strip()
 
-    for entry in entries:
-        lease_status_match = re.search(
-            r"lease_status:\s*(.+?)(?=\s+lessee:|$)", entry, re.IGNORECASE
+    return lessees[~lessees.str.lower().isin(EMPTY_LESSEES)].str.upper()
+
+
+def active_lessees(activity_info: pd.DataFrame, index: pd.Index) -> pd.Series:
+    """
+    Lists the lessees of each parcel's active activities from an activity info
+    table.
+
+    Arguments:
+    activity_info -- A long-form table of activity information, as returned by
+    activity.build_activity_info.
+    index -- The row labels of the parcels to list lessees for.
+
+    Returns:
+    A Series of strings containing the lessee information, indexed by index.
+    """
+    activity_info = activity_info[activity_info[ROW_IDX].isin(index)]
+    active = activity_info[LEASE_STATUS].str.strip().str.lower().isin(ACTIVE_STATUSES)
+
+    lessees = split_lessees(activity_info[active].set_index(ROW_IDX)[LESSEE])
+
+    return (
+        lessees.groupby(level=0, sort=False)
+        .agg("; ".join)
+        .reindex(index, fill_value="")
+        .rename(LESSEE)
+    )
+
+
+def join_lessees(*lessees: pd.Series) -> pd.Series:
+    """
+    Joins the lessee information of each parcel from several sources, skipping
+    empty ones.
+
+    Arguments:
+    lessees -- Series of strings containing lessee information, sharing an
+    index.
+
+    Returns:
+    A Series of strings containing the joined lessee information.
+    """
+    joined = lessees[0]
+    for other in lessees[1:]:
+        joined = joined.where(
+            other == "", other.where(joined == "", joined + "; " + other)
         )
-        lessee_match = re.search(r"lessee:\s*(.+?)(?=\n|$)", entry, re.IGNORECASE)
 
-        if lease_status_match and lessee_match:
-            lease_status = lease_status_match.group(1).strip().lower()
-            lessee = lessee_match.group(1).strip()
+    return joined
 
-            if lease_status in active_statuses:
-                lessees = [
-                    l.strip()
-                    for l in lessee.split(";")
-                    if l.strip().lower() not in ["none", ""]
-                ]
-                active_lessees.extend([l.upper() for l in lessees])
 
-    return "; ".join(active_lessees) if active_lessees else ""
+def parse_lessees(activity_info: pd.Series) -> pd.Series:
+    """
+    Parses the lessee information from every value of the activity_info column.
+
+    Each distinct activity_info value is parsed once, since adjacent parcels
+    often share the same activities. The values are split into entries, each
+    entry's lease status and lessee are extracted, and the lessees of entries
+    with an active status are joined back together per value.
+
+    Arguments:
+    activity_info -- The activity_info column.
+
+    Returns:
+    A Series of strings containing the lessee information, aligned with
+    activity_info.
+    """
+    codes, uniques = pd.factorize(activity_info)
+
+    entries = (
+        pd.Series(uniques, dtype=object)
+        .astype(str)
+        .str.strip()
+        .str.split(ENTRY_SEPARATOR)
+        .explode()
+    )
+    lease_status = entries.str.extract(LEASE_STATUS_PATTERN)[0]
+    lessee = entries.str.extract(LESSEE_PATTERN)[0]
+
+    active = lease_status.notna() & lessee.notna()
+    active &= lease_status.str.strip().str.lower().isin(ACTIVE_STATUSES)
+
+    lessees = split_lessees(lessee[active])
+
+    parsed = (
+        lessees.groupby(level=0)
+        .agg("; ".join)
+        .reindex(range(len(uniques)), fill_value="")
+        .to_numpy(dtype=object)
+    )
+
+    # Missing values have a code of -1, and parse to "".
+    return pd.Series(
+        parsed[codes] if len(parsed) else "",
+        index=activity_info.index,
+        dtype=object,
+    ).where(codes >= 0, "")
+
+
+def parcel_lessees(
+    activity_info: pd.DataFrame, activity_info_2: pd.Series
+) -> pd.Series:
+    """
+    Lists each parcel's active lessees, from both its matched activities and
+    its activity_info_2 column.
+
+    The lessees of matched activities are read from the activity info table,
+    and those in activity_info_2, which only exists as text, are parsed from
+    it. A parcel's activity_info_2 is normally a list of whole entries, but
+    when it instead continues the last entry of its matched activities, the two
+    are parsed together as concatenated text, so the continuation is read as
+    part of that entry.
+
+    Arguments:
+    activity_info -- A long-form table of activity information, as returned by
+    activity.build_activity_info.
+    activity_info_2 -- The activity_info_2 column, indexed by the parcels' row
+    labels.
+
+    Returns:
+    A Series of strings containing the lessee information, aligned with
+    activity_info_2.
+    """
+    index = activity_info_2.index
+    lessees = join_lessees(
+        active_lessees(activity_info, index), parse_lessees(activity_info_2)
+    )
+
+    text = activity_info_2.fillna("").astype(object).str.strip()
+    continued = (
+        text.ne("")
+        & ~text.str.startswith(ENTRY_START)
+        & index.isin(activity_info[ROW_IDX])
+    )
+    if continued.any():
+        lessees[continued] = parse_lessees(
+            concatenate_activity_info_columns(
+                render_activity_info(activity_info, index[continued]),
+                activity_info_2[continued],
+            )
+        )
+
+    return lessees
+
+
+def parse_lessee(activity_info: str) -> str:
+    """
+    Parses the lessee information from the activity_info column.
+
+    Arguments:
+    activity_info -- The activity_info column value.
+
+    Returns:
+    A string containing the lessee information.
+    """
+    return parse_lessees(pd.Series([activity_info], dtype=object)).iloc[0]
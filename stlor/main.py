@@ -1,19 +1,26 @@
-from collections import defaultdict
+import argparse
 from datetime import datetime
 from functools import partial
 import logging
+from multiprocessing.shared_memory import SharedMemory
 from pathlib import Path
 import sys
+from typing import Optional, Sequence, get_args
 
 import geopandas as gpd
+import numpy as np
 import pandas as pd
 
 from stlor.activity import (
-    get_activity_name,
+    get_required_columns,
+    resolve_activity_names,
     is_compatible_activity,
     exclude_inactive,
     capture_lessee_and_lease_type,
+    build_activity_info,
+    render_activity_info,
 )
+from stlor.cache import ACTIVITY_CACHE_DIR
 from stlor.clean import (
     join_activity_info,
     remove_timber_rows,
@@ -26,21 +33,83 @@ from stlor.clip import clip_to_reservation_boundaries, filter_parcels_by_acreage
 from stlor.config import STATE_ACTIVITIES
 from stlor.constants import (
     ACTIVITY_INFO,
+    ACTIVITY_INFO_2,
+    ACTIVITY_NAME,
     ACTIVITY,
     FINAL_DATASET_COLUMNS,
+    LAYER_INDEX,
+    LEASE_STATUS,
+    MATCH_COLUMNS,
     OBJECT_ID,
     RIGHTS_TYPE,
+    ROW_IDX,
     LESSEE,
-    WGS_84,
+    STATE,
 )
 from stlor.entities import StateActivityDataSource
-from stlor.lessee import parse_lessee
-from stlor.overlap import tree_based_proximity
-from stlor.utils import in_parallel, combine_delim_list
+from stlor.lessee import parcel_lessees
+from stlor.manifest import (
+    MANIFEST_FILENAME,
+    MATCH_CACHE_DIR,
+    RunManifest,
+    hash_state_parcels,
+    log_changes,
+    match_key,
+    read_state_matches,
+    state_entry,
+    write_state_matches,
+)
+from stlor.output import (
+    OUTPUT_FORMATS,
+    OutputFormat,
+    publish_xlsx,
+    read_gdf,
+    write_gdf_to_disk,
+)
+from stlor.overlap import (
+    MATCH_DIST_THRESHOLD,
+    CandidatePairs,
+    MatchMode,
+    ParcelIndex,
+    activity_batches,
+    concat_candidate_pairs,
+    iter_matches,
+    match_batch,
+    match_shared_batch,
+)
+from stlor.pipeline import CHECKPOINT_DIR, Pipeline, Stage
+from stlor.reservations import RESERVATION_SOURCES
+from stlor.schema import FINAL_DATASET_SCHEMA, apply_schema
+from stlor.scheduler import Scheduler, WorkerKind, log_timings
+from stlor.shared import SharedGeometries, share_geometries
+from stlor.utils import combine_delim_lists
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# The datasets main writes to its output directory, in pipeline order.
+OUTPUT_DATASETS = [
+    "03_ActivityMatch",
+    "04_Clipped",
+    "05_AcreageGreaterThan10",
+    "06_All-STLs-on-Reservations-Final",
+]
+
+# The supplemental STL datasets concatenated to the main STL dataset: STLs
+# identified from the BIA-AIAN supplemental dataset, and Nebraska and South
+# Dakota subsurface parcels.
+SUPPLEMENTAL_STL_PATHS = [
+    Path("public_data/04_All States/01d_Supplemental.geojson").resolve(),
+    Path("public_data/04_All States/01e_Nebraska_Subsurface.geojson").resolve(),
+    Path("public_data/04_All States/01f_SouthDakota_Subsurface.geojson").resolve(),
+]
+
+# The public copy of the final dataset, as a (directory, file name) pair.
+FINAL_DATASET_COPY = (
+    Path("public_data/05_Final-Dataset").resolve(),
+    "02_All-STLs-on-Reservations",
+)
+
 
 def concatenate_main_and_supplemental_stls(
     stl_gdf: gpd.GeoDataFrame,
@@ -55,73 +124,94 @@ def concatenate_main_and_supplemental_stls(
     with state trust lands identified from the BIA-AIAN supplemental dataset and
     Nebraska subsurface data
     """
-    supplemental_stl_gdf = gpd.read_file(
-        Path("public_data/04_All States/01d_Supplemental.geojson").resolve()
-    )
-    ne_subsurface_gdf = gpd.read_file(
-        Path("public_data/04_All States/01e_Nebraska_Subsurface.geojson").resolve()
-    )
-    sd_subsurface_gdf = gpd.read_file(
-        Path("public_data/04_All States/01f_SouthDakota_Subsurface.geojson").resolve()
-    )
-
     return gpd.GeoDataFrame(
         pd.concat(
-            [stl_gdf, supplemental_stl_gdf, ne_subsurface_gdf, sd_subsurface_gdf],
+            [stl_gdf, *(read_gdf(path) for path in SUPPLEMENTAL_STL_PATHS)],
             ignore_index=True,
         )
     )
 
 
-def process_state_activity(
+def load_state_activity(
     activities_dir: Path,
-    stl_gdf: gpd.GeoDataFrame,
+    parcel_index: ParcelIndex,
     state: str,
     activity: StateActivityDataSource,
-) -> dict:
-    """Locate matches between state trust lands and a specific land use activity.
-
-    This function makes use of our tree_based_proximity function, which uses
-    R-tree spatial indexes to efficiently identify matches bewteen parcels and
-    a given land use activity.
+    mode: MatchMode = "nearest",
+    cache_dir: Optional[Path] = ACTIVITY_CACHE_DIR,
+) -> gpd.GeoDataFrame:
+    """Load a land use activity layer, projected to the parcels' CRS.
 
     Arguments:
     activities_dir -- the directory containing state activity layers
-    stl_gdf -- the state trust lands GeoDataFrame
+    parcel_index -- the spatial index of state trust lands parcels
     state -- the activity's associated state abbreviation
     activity -- the activity data source
+    mode -- the matching engine the layer will be matched with
+    cache_dir -- the activity layer cache directory, or None to bypass the cache
 
     Returns:
-    dict -- a dictionary of STL parcel row indices mapped to tuples containing
-    the matched activity name and activity information
+    gpd.GeoDataFrame -- the activity layer
     """
-    # Load the activity data for the given StateActivityDataSource.
-    activity_gdf = activity.query_data(activities_dir)
+    # Load the activity data for the given StateActivityDataSource, reading only
+    # the columns the match uses. In "query" mode, activities can only match
+    # parcels within MATCH_DIST_THRESHOLD, so features beyond the parcels'
+    # extent are never decoded. "nearest" mode keeps the full layer, since its
+    # matches depend on how the layer is batched.
+    columns = get_required_columns(
+        state, activity, activity.list_columns(activities_dir)
+    )
+    bbox = parcel_index.extent(MATCH_DIST_THRESHOLD) if mode == "query" else None
+    activity_gdf = activity.query_projected(
+        activities_dir,
+        parcel_index.crs,
+        columns=columns,
+        bbox=bbox,
+        cache_dir=cache_dir,
+    )
 
     if activity_gdf is None or len(activity_gdf) == 0:
         logger.error(
             f"No activity data found for state: {state} and activity: {activity.name}"
         )
 
-    # Use our R-tree spatial index to find matches between STL parcels and the
-    # given StateActivityDataSource.
-    matches = tree_based_proximity(stl_gdf, activity_gdf, stl_gdf.crs)
+    return activity_gdf
+
+
+def collect_state_activity_matches(
+    parcel_index: ParcelIndex,
+    state: str,
+    activity: StateActivityDataSource,
+    activity_gdf: gpd.GeoDataFrame,
+    pairs: CandidatePairs,
+) -> pd.DataFrame:
+    """Turn the candidate pairs between parcels and an activity layer into
+    matched activity names and information.
+
+    Arguments:
+    parcel_index -- the spatial index of state trust lands parcels
+    state -- the activity's associated state abbreviation
+    activity -- the activity data source
+    activity_gdf -- the activity layer
+    pairs -- the candidate pairs between parcel_index and activity_gdf
+
+    Returns:
+    pd.DataFrame -- a long-form table of distinct (row_idx, activity_name,
+    layer_index, lease_status, lessee) matches, keyed by STL parcel row index;
+    the activity information fields are missing for activities without any
+    """
+    matches = iter_matches(parcel_index, activity_gdf, pairs)
 
-    rewrite_list = {
-        "OtherMin": "Other Minerals",
-        "OilGas": "Oil & Gas",
-        "OilAndGas": "Oil & Gas",
-    }
-    update = defaultdict(set)
+    # Resolve every activity's name in one pass over the layer rather than once
+    # per match.
+    activity_names = resolve_activity_names(state, activity, activity_gdf).to_numpy()
+    update = set()
 
     # Iterate over the matches and capture the activity name and information.
     # Filter out incompatible activities, as well as select parcels with certain
     # activity statuses.
-    for _, parcel_index, parcel, activity_row, contains, _ in matches:
-        activity_name = get_activity_name(state, activity, pd.DataFrame([activity_row]))
-
-        if activity_name in rewrite_list:
-            activity_name = rewrite_list[activity_name]
+    for _, parcel_label, parcel, activity_row, contains, position in matches:
+        activity_name = activity_names[position]
 
         if contains and is_compatible_activity(parcel, activity, activity_name, state):
             if exclude_inactive(state, activity_row):
@@ -131,86 +221,428 @@ def process_state_activity(
                 activity_row, activity, activity_name, state
             )
 
-            update[parcel_index].add((activity_name, activity_info))
+            if activity_info is None:
+                update.add((parcel_label, activity_name, None, None, None))
+            else:
+                update.add(
+                    (
+                        parcel_label,
+                        activity_name,
+                        activity_info[LAYER_INDEX],
+                        activity_info[LEASE_STATUS],
+                        activity_info[LESSEE],
+                    )
+                )
+
+    return pd.DataFrame(list(update), columns=MATCH_COLUMNS)
 
-    return update
+
+def process_state_activity(
+    activities_dir: Path,
+    parcel_index: ParcelIndex,
+    state: str,
+    activity: StateActivityDataSource,
+    mode: MatchMode = "nearest",
+    cache_dir: Optional[Path] = ACTIVITY_CACHE_DIR,
+) -> pd.DataFrame:
+    """Locate matches between state trust lands and a specific land use activity.
+
+    This runs the load, match, and collect stages of a single activity layer in
+    sequence; match_activities runs the same stages for every layer on a shared
+    Scheduler.
+
+    Arguments:
+    activities_dir -- the directory containing state activity layers
+    parcel_index -- the spatial index of state trust lands parcels
+    state -- the activity's associated state abbreviation
+    activity -- the activity data source
+    mode -- the matching engine to use, either "nearest" or "query"
+    cache_dir -- the activity layer cache directory, or None to bypass the cache
+
+    Returns:
+    pd.DataFrame -- a long-form table of distinct (row_idx, activity_name,
+    layer_index, lease_status, lessee) matches, keyed by STL parcel row index;
+    the activity information fields are missing for activities without any
+    """
+    activity_gdf = load_state_activity(
+        activities_dir, parcel_index, state, activity, mode=mode, cache_dir=cache_dir
+    )
+    geometries = np.asarray(activity_gdf.geometry.values, dtype=object)
+    pairs = concat_candidate_pairs(
+        [
+            match_batch(parcel_index, geometries, batch, mode=mode)
+            for batch in activity_batches(len(geometries))
+        ]
+    )
+
+    return collect_state_activity_matches(
+        parcel_index, state, activity, activity_gdf, pairs
+    )
+
+
+def build_state_parcel_index(
+    stl_gdf: gpd.GeoDataFrame, parcel_states: pd.Series, state: str
+) -> ParcelIndex:
+    """Build the ParcelIndex of a single state's trust lands.
+
+    is_compatible_activity rejects any match between a parcel and an activity
+    from a different state, so each state's activities only need to probe that
+    state's parcels.
+
+    Arguments:
+    stl_gdf -- the state trust lands GeoDataFrame
+    parcel_states -- the lowercased state of each parcel in stl_gdf
+    state -- the state abbreviation to build the index for
+
+    Returns:
+    ParcelIndex -- the state's parcel index, preserving the parcels' row labels
+    in stl_gdf
+    """
+    return ParcelIndex.from_gdf(
+        stl_gdf[parcel_states == state.lower()], columns=[STATE, RIGHTS_TYPE]
+    )
 
 
 def match_activities(
-    activities_dir: Path, stl_gdf: gpd.GeoDataFrame
-) -> tuple[dict, dict]:
+    activities_dir: Path,
+    stl_gdf: gpd.GeoDataFrame,
+    mode: MatchMode = "nearest",
+    cache_dir: Optional[Path] = ACTIVITY_CACHE_DIR,
+    max_workers: Optional[int] = None,
+    workers: WorkerKind = "threads",
+    match_cache_dir: Optional[Path] = MATCH_CACHE_DIR,
+    manifest: Optional[RunManifest] = None,
+) -> pd.DataFrame:
     """Accumulate matches between state trust lands and land use activities.
 
+    Every state is matched on one Scheduler. Each state's parcel index is built
+    once and shared by that state's activity layers; each layer is loaded, split
+    into batches that are matched independently, and its matches are collected
+    once all of its batches are done. All of these tasks, across every state,
+    share the scheduler's single queue, so a large layer's batches spread
+    across all workers while smaller states run alongside it.
+
+    With workers="processes", batches are matched in worker processes. Parcel
+    and activity geometries reach them as WKB in shared memory rather than
+    being pickled into every task; each worker rebuilds a state's parcel index
+    once and decodes only its batch's activities.
+
+    Each state's matches are cached, keyed by a hash of everything they depend
+    on: the state's parcels, its activity layers, its config, and the matching
+    engine. States whose inputs are unchanged since a previous run reuse their
+    cached matches rather than being matched again.
+
     Arguments:
     activities_dir -- the directory containing state activity layers
     stl_gdf -- the state trust lands GeoDataFrame
+    mode -- the matching engine to use, either "nearest" or "query"
+    cache_dir -- the activity layer cache directory, or None to bypass the cache
+    max_workers -- the number of workers, or None to use one per core
+    workers -- whether to match batches in "threads" or "processes"
+    match_cache_dir -- the per-state match cache directory, or None to match
+    every state
+    manifest -- the run manifest to record each state's inputs in; the previous
+    run's manifest is read from match_cache_dir
 
     Returns:
-    tuple[dict, dict] -- a tuple containing (1) a dictionary of STL parcel row
-    indices mapped to matching activity information and (2) a dictionary of STL
-    parcel row indices mapped to matching activity information strings
+    pd.DataFrame -- a long-form table of (row_idx, activity_name, layer_index,
+    lease_status, lessee) matches, keyed by STL parcel row index
     """
-    stl_data_update = defaultdict(set)
-    activity_info_update = defaultdict(set)
+    results = []
+    manifest = RunManifest() if manifest is None else manifest
+    parcel_states = stl_gdf[STATE].str.lower()
+
+    # Reuse the cached matches of every state whose inputs are unchanged.
+    states = list(STATE_ACTIVITIES)
+    if match_cache_dir is not None:
+        previous = RunManifest.load(match_cache_dir / MANIFEST_FILENAME)
+        parcel_hashes = hash_state_parcels(stl_gdf, parcel_states)
+        for state in list(states):
+            entry = state_entry(
+                state,
+                activities_dir,
+                parcel_hashes.get(state.lower(), ""),
+                mode,
+                MATCH_DIST_THRESHOLD,
+                manifest,
+                previous,
+            )
+            manifest.states[state] = entry
+
+            cached = read_state_matches(match_cache_dir, state, entry.key)
+            if cached is not None:
+                entry.reused = True
+                results.append(cached)
+                states.remove(state)
+
+        log_changes(manifest, previous)
+        reused = [state for state in STATE_ACTIVITIES if state not in states]
+        if reused:
+            logger.info(f"Reusing cached matches for states: {','.join(reused)}")
+
+    logger.info(f"Running activity match for states: {','.join(states)}")
+
+    scheduler = Scheduler(max_workers=max_workers, workers=workers)
+    # Shared memory blocks backing geometries sent to worker processes.
+    shared_blocks: list[SharedMemory] = []
+    shared_parcels: dict[str, SharedGeometries] = {}
+
+    def share(geometries: np.ndarray) -> tuple[SharedMemory, SharedGeometries]:
+        shm, handle = share_geometries(geometries)
+        shared_blocks.append(shm)
+        return shm, handle
+
+    def release(shm: SharedMemory):
+        shared_blocks.remove(shm)
+        shm.close()
+        shm.unlink()
+
+    # The matches of each state being matched, and its number of activity
+    # layers still to be collected.
+    state_results: dict[str, list[pd.DataFrame]] = {state: [] for state in states}
+    remaining = {state: len(STATE_ACTIVITIES[state].activities) for state in states}
+
+    def on_index(state: str, parcel_index: ParcelIndex):
+        logger.info(
+            f"Running activity match for {state} against {len(parcel_index)} parcels"
+        )
+        if workers == "processes":
+            _, shared_parcels[state] = share(parcel_index.geometries)
+
+        if not remaining[state]:
+            on_state(state)
+
+        for activity in STATE_ACTIVITIES[state].activities:
+            scheduler.submit(
+                (state, activity.name, "load"),
+                load_state_activity,
+                activities_dir,
+                parcel_index,
+                state,
+                activity,
+                mode=mode,
+                cache_dir=cache_dir,
+                then=partial(on_load, state, activity, parcel_index),
+            )
 
-    logger.info(
-        f"Running activity match for states: {','.join(STATE_ACTIVITIES.keys())}"
-    )
+    def on_load(state, activity, parcel_index, activity_gdf):
+        geometries = np.asarray(activity_gdf.geometry.values, dtype=object)
+        batches = activity_batches(len(geometries))
+        batch_pairs = [None] * len(batches)
+
+        shm = None
+        if workers == "processes" and batches:
+            shm, handle = share(geometries)
+            match_fn, match_args = match_shared_batch, (shared_parcels[state], handle)
+        else:
+            match_fn, match_args = match_batch, (parcel_index, geometries)
+
+        if not batches:
+            on_batch(
+                state, activity, parcel_index, activity_gdf, batch_pairs, shm, 0, None
+            )
 
-    for state, state_activities in STATE_ACTIVITIES.items():
-        logger.info(f"Running activity match for {state}")
+        for i, batch in enumerate(batches):
+            scheduler.submit(
+                (state, activity.name, f"batch {i + 1}/{len(batches)}"),
+                match_fn,
+                *match_args,
+                batch,
+                mode=mode,
+                in_process=True,
+                then=partial(
+                    on_batch,
+                    state,
+                    activity,
+                    parcel_index,
+                    activity_gdf,
+                    batch_pairs,
+                    shm,
+                    i,
+                ),
+            )
 
-        start_time = datetime.now()
-        results = in_parallel(
-            state_activities.activities,
-            partial(process_state_activity, activities_dir, stl_gdf, state),
+    def on_batch(
+        state, activity, parcel_index, activity_gdf, batch_pairs, shm, i, pairs
+    ):
+        if batch_pairs:
+            batch_pairs[i] = pairs
+        if any(p is None for p in batch_pairs):
+            return
+
+        if shm is not None:
+            release(shm)
+
+        scheduler.submit(
+            (state, activity.name, "collect"),
+            collect_state_activity_matches,
+            parcel_index,
+            state,
+            activity,
+            activity_gdf,
+            concat_candidate_pairs(batch_pairs),
+            then=partial(on_collect, state),
         )
-        logger.info(f"Activity match for {state} took {datetime.now() - start_time}")
 
-        for result in results:
-            if result is not None and len(result) > 0:
-                for row_idx, activity_bundle in result.items():
-                    for activity_name, activity_info in activity_bundle:
-                        if any(i is None for i in activity_name):
-                            logger.error(f"Activity is None for {state}")
-                            sys.exit(1)
+    def on_collect(state: str, result: pd.DataFrame):
+        if result[ACTIVITY_NAME].isna().any():
+            logger.error(f"Activity is None for {state}")
+            sys.exit(1)
+
+        state_results[state].append(result)
+        remaining[state] -= 1
+        if not remaining[state]:
+            on_state(state)
+
+    def on_state(state: str):
+        collected = state_results.pop(state)
+        matches = (
+            pd.concat(collected, ignore_index=True)
+            if collected
+            else pd.DataFrame(columns=MATCH_COLUMNS)
+        )
+        if match_cache_dir is not None:
+            write_state_matches(
+                match_cache_dir, state, manifest.states[state].key, matches
+            )
+
+        results.append(matches)
+
+    def start(scheduler: Scheduler):
+        for state in states:
+            scheduler.submit(
+                (state, "index"),
+                build_state_parcel_index,
+                stl_gdf,
+                parcel_states,
+                state,
+                then=partial(on_index, state),
+            )
+
+    start_time = datetime.now()
+    try:
+        timings = scheduler.run(start)
+    finally:
+        for shm in list(shared_blocks):
+            release(shm)
+    logger.info(
+        f"Activity match took {datetime.now() - start_time} "
+        f"on {scheduler.max_workers} workers"
+    )
+    log_timings(timings)
 
-                        stl_data_update[row_idx].add(activity_name)
-                        activity_info_update[row_idx].add(activity_info)
+    if match_cache_dir is not None:
+        manifest.save(match_cache_dir / MANIFEST_FILENAME)
 
-    return stl_data_update, activity_info_update
+    if not results:
+        return pd.DataFrame(columns=MATCH_COLUMNS)
 
+    return pd.concat(results, ignore_index=True)
 
-def write_gdf_to_disk(gdf: gpd.GeoDataFrame, output_dir: Path, filename: str):
-    """Write a GeoDataFrame to disk on GeoJSON (EPSG:5070), GeoJSON (EPSG:4326),
-    CSV, and XLSX formats.
+
+def apply_matches(stl_gdf: gpd.GeoDataFrame, matches: pd.DataFrame) -> pd.DataFrame:
+    """Merge a long-form table of matches into the activity column of the STL
+    GeoDataFrame, and collect their activity information.
+
+    Each matched parcel's activity becomes the sorted, deduplicated union of its
+    existing activities and its matched activity names. The matches' activity
+    information is kept as a table rather than a column of strings; it's
+    rendered into the activity_info column only when a dataset is written, by
+    with_activity_info.
 
     Arguments:
-    gdf -- the GeoDataFrame to write to disk
-    output_dir -- the directory for the output files
-    filename -- the name of the output file
+    stl_gdf -- the state trust lands GeoDataFrame
+    matches -- a long-form table of (row_idx, activity_name, layer_index,
+    lease_status, lessee) matches, as returned by match_activities
 
     Returns:
-    None
+    pd.DataFrame -- a long-form table of activity information, as returned by
+    build_activity_info
 
     Side effects:
-    Writes the GeoDataFrame to disk
+    Updates the activity column of stl_gdf in place
+    """
+    matched_rows = pd.Index(matches[ROW_IDX].unique())
+
+    if len(matched_rows) > 0:
+        activities = combine_delim_lists(
+            stl_gdf.loc[matched_rows, ACTIVITY],
+            matches.set_index(ROW_IDX)[ACTIVITY_NAME],
+        )
+        stl_gdf.loc[matched_rows, ACTIVITY] = activities.reindex(
+            matched_rows, fill_value=""
+        )
+
+    return build_activity_info(matches)
+
+
+def with_activity_info(
+    stl_gdf: gpd.GeoDataFrame, activity_info: pd.DataFrame
+) -> gpd.GeoDataFrame:
+    """Render the activity_info column of the STL GeoDataFrame from a table of
+    activity information, placing it two columns after rights_type.
+
+    Arguments:
+    stl_gdf -- the state trust lands GeoDataFrame
+    activity_info -- a long-form table of activity information, as returned by
+    apply_matches
+
+    Returns:
+    gpd.GeoDataFrame -- a copy of the state trust lands GeoDataFrame with an
+    activity_info column
     """
-    gdf.to_file(output_dir / f"{filename}.geojson", driver="GeoJSON")
-    gdf.to_crs(WGS_84).to_file(
-        output_dir / f"{filename}_WGS84.geojson", driver="GeoJSON"
+    stl_gdf = stl_gdf.copy()
+    stl_gdf.insert(
+        stl_gdf.columns.get_loc(RIGHTS_TYPE) + 2,
+        ACTIVITY_INFO,
+        render_activity_info(activity_info, stl_gdf.index),
     )
-    gdf.to_csv(output_dir / f"{filename}.csv", index=False)
-    gdf.to_excel(output_dir / f"{filename}.xlsx", index=False)
+
+    return apply_schema(stl_gdf)
+
+
+# The stages of main, in pipeline order.
+STAGES = ["load", "match", "clip", "filter", "finalize"]
 
 
-def main(activities_dir: Path, stl_path: Path, output_dir: Path):
+def main(
+    activities_dir: Path,
+    stl_path: Path,
+    output_dir: Path,
+    match_mode: MatchMode = "nearest",
+    cache_dir: Optional[Path] = ACTIVITY_CACHE_DIR,
+    match_workers: WorkerKind = "threads",
+    match_max_workers: Optional[int] = None,
+    output_formats: Sequence[OutputFormat] = OUTPUT_FORMATS,
+    defer_xlsx: bool = False,
+    match_cache_dir: Optional[Path] = MATCH_CACHE_DIR,
+    from_stage: Optional[str] = None,
+    until_stage: Optional[str] = None,
+    checkpoint_dir: Path = CHECKPOINT_DIR,
+):
     """Match state trust lands parcels to land use activities.
 
+    The process runs as a Pipeline of STAGES, each of which checkpoints its
+    output, so a run can resume from any stage without recomputing the stages
+    before it.
+
     Arguments:
     activities_dir -- the directory containing state activity layers
     stl_path -- the path to the state trust lands dataset
     output_dir -- the directory to write the output files
+    match_mode -- the matching engine to use, either "nearest" or "query"
+    cache_dir -- the activity layer cache directory, or None to bypass the cache
+    match_workers -- whether to match batches in "threads" or "processes"
+    match_max_workers -- the number of matching workers, or None to use one per
+    core
+    output_formats -- the formats to write each output dataset in
+    defer_xlsx -- whether to skip XLSX output, leaving it to publish()
+    match_cache_dir -- the per-state match cache directory, or None to match
+    every state
+    from_stage -- the first stage to run, reading the outputs of earlier stages
+    from their checkpoints, or None to run from the start
+    until_stage -- the last stage to run, or None to run through the end
+    checkpoint_dir -- the directory stage checkpoints are written to
 
     Returns:
     None
@@ -218,130 +650,295 @@ def main(activities_dir: Path, stl_path: Path, output_dir: Path):
     Side effects:
     Writes the output of the activity match process to output_dir
     """
-    logger.info(f"Reading STLoR data from: {stl_path}")
-    stl_gdf = gpd.read_file(stl_path)
-
-    # Concatenate this dataframe with the supplemental STLs derived from
-    # supplemental.py and the Nebraska subsurface parcels in 01e_Nebraska_Subsurface.
-    logger.info("Concatenating main and supplemental state trust lands datasets.")
-    stl_gdf = concatenate_main_and_supplemental_stls(stl_gdf)
-
-    logger.info(f"Initial STLoR row count: {stl_gdf.shape[0]}")
-
-    # Obtain the initial columns from the STL GeoDataFrame.
-    cols = stl_gdf.columns.tolist()
-
-    # Add the activity info column to the list of STL GeoDataFrame columns.
-    rights_type_idx = cols.index(RIGHTS_TYPE)
-    cols.insert(rights_type_idx + 2, ACTIVITY_INFO)
-
-    # Run the primary matching process.
-    stl_data_update, activity_info_update = match_activities(activities_dir, stl_gdf)
-
-    # Push updates from the matching process to the STL GeoDataFrame.
-    for row_idx, activity_list in stl_data_update.items():
-        if not activity_list:
-            continue
-        new_activity = ",".join([x for x in activity_list if x is not None])
-        existing_activity = stl_gdf.loc[row_idx, ACTIVITY] or ""
-        stl_gdf.loc[row_idx, ACTIVITY] = combine_delim_list(
-            existing_activity,
-            new_activity,
+    if defer_xlsx:
+        output_formats = [f for f in output_formats if f != "xlsx"]
+
+    def load() -> gpd.GeoDataFrame:
+        logger.info(f"Reading STLoR data from: {stl_path}")
+        stl_gdf = read_gdf(stl_path)
+
+        # Concatenate this dataframe with the supplemental STLs derived from
+        # supplemental.py and the Nebraska subsurface parcels in 01e_Nebraska_Subsurface.
+        logger.info("Concatenating main and supplemental state trust lands datasets.")
+        stl_gdf = concatenate_main_and_supplemental_stls(stl_gdf)
+
+        # Store low-cardinality columns as categories and free text as pyarrow
+        # strings for the rest of the pipeline.
+        stl_gdf = apply_schema(stl_gdf)
+
+        logger.info(f"Initial STLoR row count: {stl_gdf.shape[0]}")
+
+        return stl_gdf
+
+    def match(
+        stl_gdf: gpd.GeoDataFrame,
+    ) -> tuple[gpd.GeoDataFrame, pd.DataFrame]:
+        # Record the run's inputs in a manifest, alongside the per-state inputs
+        # the matching process records.
+        manifest = RunManifest()
+        if match_cache_dir is not None:
+            previous = RunManifest.load(match_cache_dir / MANIFEST_FILENAME)
+            manifest.inputs["stl"] = manifest.hash_files(
+                [stl_path, *SUPPLEMENTAL_STL_PATHS], previous
+            )
+            manifest.inputs["reservations"] = manifest.hash_files(
+                [path.resolve() for path in RESERVATION_SOURCES], previous
+            )
+
+        # Run the primary matching process.
+        matches = match_activities(
+            activities_dir,
+            stl_gdf,
+            mode=match_mode,
+            cache_dir=cache_dir,
+            max_workers=match_max_workers,
+            workers=match_workers,
+            match_cache_dir=match_cache_dir,
+            manifest=manifest,
         )
 
-    stl_gdf[ACTIVITY_INFO] = ""
-    for row_idx, activity_info in activity_info_update.items():
-        if not activity_info:
-            continue
-        new_activity_info = "\n".join([x for x in activity_info if x is not None])
-        existing_activity_info = stl_gdf.loc[row_idx, ACTIVITY_INFO] or ""
-        stl_gdf.loc[row_idx, ACTIVITY_INFO] = combine_delim_list(
-            existing_activity_info, new_activity_info, sep="\n"
+        # Push updates from the matching process to the STL GeoDataFrame,
+        # collecting the matches' activity information alongside it.
+        activity_info = apply_matches(stl_gdf, matches)
+
+        # Remove timber parcels from the dataset.
+        stl_gdf = remove_timber_rows(stl_gdf)
+        logger.info(
+            f"STLoR row count after removing timber parcels: {stl_gdf.shape[0]}"
         )
 
-    # Reorder and select columns from the original STL GeoDataFrame.
-    stl_gdf = stl_gdf[cols]
+        # Remove borderline river parcels from the dataset.
+        stl_gdf = remove_river_slivers(stl_gdf)
+        logger.info(
+            f"STLoR row count after removing river sliver polygons: {stl_gdf.shape[0]}"
+        )
 
-    # Remove timber parcels from the dataset.
-    stl_gdf = remove_timber_rows(stl_gdf)
-    logger.info(f"STLoR row count after removing timber parcels: {stl_gdf.shape[0]}")
+        # Remove inappropriate Idaho trust parcels from the dataset.
+        stl_gdf = filter_id_trust_names(stl_gdf)
+        logger.info(
+            f"STLoR row count after removing inappropriate Idaho trust parcels: {stl_gdf.shape[0]}"
+        )
 
-    # Remove borderline river parcels from the dataset.
-    stl_gdf = remove_river_slivers(stl_gdf)
-    logger.info(
-        f"STLoR row count after removing river sliver polygons: {stl_gdf.shape[0]}"
-    )
+        # Remove inappropriate Oklahoma trust parcels from the dataset.
+        stl_gdf = filter_ok_trust_names(stl_gdf)
+        logger.info(
+            f"STLoR row count after removing inappropriate Oklahoma trust parcels: {stl_gdf.shape[0]}"
+        )
 
-    # Remove inappropriate Idaho trust parcels from the dataset.
-    stl_gdf = filter_id_trust_names(stl_gdf)
-    logger.info(
-        f"STLoR row count after removing inappropriate Idaho trust parcels: {stl_gdf.shape[0]}"
-    )
+        # Clean up trust names.
+        stl_gdf = fix_trust_names(stl_gdf)
 
-    # Remove inappropriate Oklahoma trust parcels from the dataset.
-    stl_gdf = filter_ok_trust_names(stl_gdf)
-    logger.info(
-        f"STLoR row count after removing inappropriate Oklahoma trust parcels: {stl_gdf.shape[0]}"
-    )
+        # Write the output of the activity match process to disk.
+        logger.info(
+            "Writing activity match output to 03_ActivityMatch.{parquet,fgb,geojson,csv,xlsx}"
+        )
+        write_gdf_to_disk(
+            with_activity_info(stl_gdf, activity_info),
+            output_dir,
+            filename="03_ActivityMatch",
+            formats=output_formats,
+        )
 
-    # Clean up trust names.
-    stl_gdf = fix_trust_names(stl_gdf)
+        return stl_gdf, activity_info
 
-    # Write the output of the activity match process to disk.
-    logger.info("Writing activity match output to 03_ActivityMatch.{csv,xlsx,geojson}")
-    write_gdf_to_disk(stl_gdf, output_dir, filename="03_ActivityMatch")
+    def clip(
+        stl_gdf: gpd.GeoDataFrame, activity_info: pd.DataFrame
+    ) -> gpd.GeoDataFrame:
+        # Clip the state trust lands to reservation boundaries.
+        logger.info("Clipping state trust lands to reservation boundaries.")
+        stl_gdf = clip_to_reservation_boundaries(stl_gdf)
 
-    # Clip the state trust lands to reservation boundaries.
-    logger.info("Clipping state trust lands to reservation boundaries.")
-    start_time = datetime.now()
-    stl_gdf = clip_to_reservation_boundaries(stl_gdf)
-    logger.info(
-        f"Clipping state trust lands to reservation boundaries took {datetime.now() - start_time}"
-    )
+        # Write the clipped state trust lands to disk.
+        logger.info(
+            "Writing clipped state trust lands to 04_Clipped.{parquet,fgb,geojson,csv,xlsx}"
+        )
+        write_gdf_to_disk(
+            with_activity_info(stl_gdf, activity_info),
+            output_dir,
+            filename="04_Clipped",
+            formats=output_formats,
+        )
 
-    # Write the clipped state trust lands to disk.
-    logger.info("Writing clipped state trust lands to 04_Clipped.{csv,xlsx,geojson}")
-    write_gdf_to_disk(stl_gdf, output_dir, filename="04_Clipped")
+        return stl_gdf
 
-    # Filter parcels by acreage.
-    logger.info("Filtering parcels to those with acreage greater than 10.")
-    stl_gdf = filter_parcels_by_acreage(stl_gdf)
+    def filter_acreage(
+        stl_gdf: gpd.GeoDataFrame, activity_info: pd.DataFrame
+    ) -> gpd.GeoDataFrame:
+        # Filter parcels by acreage.
+        logger.info("Filtering parcels to those with acreage greater than 10.")
+        stl_gdf = filter_parcels_by_acreage(stl_gdf)
 
-    # Write the filtered state trust lands to disk.
-    logger.info(
-        "Writing filtered state trust lands to 05_AcreageGreaterThan10.{csv,xlsx,geojson}"
-    )
-    write_gdf_to_disk(stl_gdf, output_dir, filename="05_AcreageGreaterThan10")
+        # Write the filtered state trust lands to disk.
+        logger.info(
+            "Writing filtered state trust lands to 05_AcreageGreaterThan10.{parquet,fgb,geojson,csv,xlsx}"
+        )
+        write_gdf_to_disk(
+            with_activity_info(stl_gdf, activity_info),
+            output_dir,
+            filename="05_AcreageGreaterThan10",
+            formats=output_formats,
+        )
 
-    # Clean up the activity_info and object_id columns and select a subset of
-    # columns for the final dataset.
-    logger.info("Cleaning up activity_info and object_id columns.")
-    stl_gdf = join_activity_info(stl_gdf)
-    stl_gdf[LESSEE] = stl_gdf[ACTIVITY_INFO].apply(parse_lessee)
-    stl_gdf[OBJECT_ID] = stl_gdf["object_id_LAST"]
-    stl_gdf = stl_gdf[FINAL_DATASET_COLUMNS]
+        return stl_gdf
+
+    def finalize(
+        stl_gdf: gpd.GeoDataFrame, activity_info: pd.DataFrame
+    ) -> gpd.GeoDataFrame:
+        # List the lessees of active activities: those matched, from the
+        # activity info table, and those in the source datasets'
+        # activity_info_2 column, which only exists as text.
+        lessees = parcel_lessees(activity_info, stl_gdf[ACTIVITY_INFO_2])
+
+        # Clean up the activity_info and object_id columns and select a subset
+        # of columns for the final dataset.
+        logger.info("Cleaning up activity_info and object_id columns.")
+        stl_gdf = join_activity_info(with_activity_info(stl_gdf, activity_info))
+        stl_gdf[LESSEE] = lessees
+        stl_gdf[OBJECT_ID] = stl_gdf["object_id_LAST"]
+        stl_gdf = apply_schema(stl_gdf[FINAL_DATASET_COLUMNS], FINAL_DATASET_SCHEMA)
+
+        # Write the final dataset to disk, copying it to 05_Final-Dataset.
+        logger.info(
+            "Writing final dataset to 06_All-STLs-on-Reservations-Final.{parquet,fgb,geojson,csv,xlsx}"
+            " and public_data/05_Final-Dataset/02_All-STLs-on-Reservations.{parquet,fgb,geojson,csv,xlsx}"
+        )
+        write_gdf_to_disk(
+            stl_gdf,
+            output_dir,
+            filename="06_All-STLs-on-Reservations-Final",
+            copies=[FINAL_DATASET_COPY],
+            formats=output_formats,
+        )
 
-    # Write the final dataset to disk.
-    logger.info(
-        "Writing final dataset to 06_All-STLs-on-Reservations-Final.{csv,xlsx,geojson}"
-    )
-    write_gdf_to_disk(stl_gdf, output_dir, filename="06_All-STLs-on-Reservations-Final")
+        logger.info(f"Final STLoR row count: {stl_gdf.shape[0]}")
 
-    # Copy the final dataset to 05_Final-Dataset.
-    logger.info(
-        "Copying final dataset to public_data/05_Final-Dataset/02_All-STLs-on-Reservations.{csv,xlsx,geojson}"
+        return stl_gdf
+
+    # Key each stage's checkpoints by the inputs and options it reads, so a
+    # resumed run never reads checkpoints written from other inputs or options.
+    manifest = RunManifest()
+    previous = (
+        None
+        if match_cache_dir is None
+        else RunManifest.load(match_cache_dir / MANIFEST_FILENAME)
     )
-    write_gdf_to_disk(
-        stl_gdf,
-        Path("public_data/05_Final-Dataset").resolve(),
-        filename="02_All-STLs-on-Reservations",
+
+    pipeline = Pipeline(
+        [
+            Stage(
+                "load",
+                load,
+                key=manifest.hash_files([stl_path, *SUPPLEMENTAL_STL_PATHS], previous),
+            ),
+            Stage(
+                "match",
+                match,
+                inputs=["load"],
+                outputs=["match", "activity_info"],
+                key=match_key(
+                    activities_dir, match_mode, MATCH_DIST_THRESHOLD, manifest, previous
+                ),
+            ),
+            Stage(
+                "clip",
+                clip,
+                inputs=["match", "activity_info"],
+                key=manifest.hash_files(
+                    [path.resolve() for path in RESERVATION_SOURCES], previous
+                ),
+            ),
+            Stage("filter", filter_acreage, inputs=["clip", "activity_info"]),
+            Stage("finalize", finalize, inputs=["filter", "activity_info"]),
+        ],
+        checkpoint_dir=checkpoint_dir,
+        restore=apply_schema,
     )
+    pipeline.run(from_stage=from_stage, until_stage=until_stage)
+
 
-    logger.info(f"Final STLoR row count: {stl_gdf.shape[0]}")
+def publish(output_dir: Path):
+    """Write the XLSX artifacts of every output dataset of a run of main with
+    defer_xlsx=True.
+
+    Arguments:
+    output_dir -- the directory main wrote its output files to
+
+    Returns:
+    None
+
+    Side effects:
+    Writes an XLSX file next to each output dataset, and copies the final
+    dataset's XLSX file to 05_Final-Dataset
+    """
+    for filename in OUTPUT_DATASETS:
+        publish_xlsx(
+            output_dir / f"{filename}.geojson",
+            copies=[FINAL_DATASET_COPY] if filename == OUTPUT_DATASETS[-1] else [],
+        )
 
 
 def run():
     """Run the activity match, parcel clipping, and parcel filtering processes."""
+    parser = argparse.ArgumentParser(
+        description="Match state trust lands to land use activities and clip them "
+        "to reservation boundaries."
+    )
+    parser.add_argument(
+        "--defer-xlsx",
+        action="store_true",
+        help="Skip writing XLSX files; write them later with --publish.",
+    )
+    parser.add_argument(
+        "--match-mode",
+        choices=get_args(MatchMode),
+        default="nearest",
+        help="The matching engine: 'nearest' pairs each parcel with its nearest "
+        "activity in each batch of activities; 'query' pairs every parcel and "
+        "activity within the match distance in one bulk query, and reads only "
+        "the activity features near the parcels.",
+    )
+    parser.add_argument(
+        "--match-workers",
+        choices=get_args(WorkerKind),
+        default="threads",
+        help="Whether to match batches in threads or worker processes.",
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        help="The number of matching workers; defaults to one per core.",
+    )
+    parser.add_argument(
+        "--no-match-cache",
+        action="store_true",
+        help="Match every state, without reading or writing cached matches.",
+    )
+    parser.add_argument(
+        "--publish",
+        action="store_true",
+        help="Only write the XLSX files of a previous run made with --defer-xlsx.",
+    )
+    parser.add_argument(
+        "--from-stage",
+        choices=STAGES,
+        help="Resume from this stage, reading earlier stages' outputs from their "
+        "checkpoints.",
+    )
+    parser.add_argument(
+        "--until-stage",
+        choices=STAGES,
+        help="Stop after this stage.",
+    )
+    args = parser.parse_args()
+
+    output_dir = Path("public_data/04_All States").resolve()
+
+    if args.publish:
+        logger.info("Publishing XLSX files.")
+        publish(output_dir)
+        logger.info("All processes complete.")
+        return
+
     logger.info(
         "Running activity match, parcel clipping, and parcel filtering processes."
     )
@@ -350,9 +947,19 @@ def run():
     stl_path = Path(
         "public_data/04_All States/02_SendtoActivityMatch.geojson"
     ).resolve()
-    output_dir = Path("public_data/04_All States").resolve()
 
-    main(activities_dir, stl_path, output_dir)
+    main(
+        activities_dir,
+        stl_path,
+        output_dir,
+        match_mode=args.match_mode,
+        match_workers=args.match_workers,
+        match_max_workers=args.max_workers,
+        defer_xlsx=args.defer_xlsx,
+        match_cache_dir=None if args.no_match_cache else MATCH_CACHE_DIR,
+        from_stage=args.from_stage,
+        until_stage=args.until_stage,
+    )
 
     logger.info("All processes complete.")
 
@@ -0,0 +1,401 @@
+from dataclasses import asdict, dataclass, field
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from stlor.cache import HASH_CHUNK_SIZE, cache_path, source_files, write_snapshot
+from stlor.config import (
+    ACTIVITY_NAME_REWRITES,
+    ACTIVITY_REWRITE_RULES,
+    ACTIVITY_RIGHTS_TYPE,
+    STATE_ACTIVITIES,
+    STATE_ACTIVITY_CODES,
+)
+from stlor.constants import MATCH_COLUMNS, RIGHTS_TYPE, STATE
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# The default location of cached per-state matches and the run manifest.
+MATCH_CACHE_DIR = Path("data/.cache/state_matches")
+
+# The name of the run manifest within the match cache directory.
+MANIFEST_FILENAME = "manifest.json"
+
+# The version of the matching logic. Bump it when a code change alters match
+# results, so every state's cached matches are invalidated.
+MATCH_VERSION = 2
+
+
+@dataclass
+class FileFingerprint:
+    """The content hash of a file, along with the size and modification time it
+    was computed at.
+
+    A file whose size and modification time are unchanged since the previous
+    run is assumed unchanged, so it isn't read and hashed again.
+
+    size -- the file's size, in bytes
+    mtime_ns -- the file's modification time, in nanoseconds
+    sha256 -- the hex digest of the file's contents
+    """
+
+    size: int
+    mtime_ns: int
+    sha256: str
+
+
+@dataclass
+class StateEntry:
+    """A state's entry in the run manifest.
+
+    key -- the hash of every input to the state's matches
+    inputs -- the hash of each input to the state's matches, by input name
+    reused -- whether the state's matches were read from the cache
+    """
+
+    key: str
+    inputs: dict[str, str]
+    reused: bool = False
+
+
+@dataclass
+class RunManifest:
+    """A record of the inputs of a run of the activity match.
+
+    files -- the fingerprint of every input file, by path
+    inputs -- the hash of each input of the run as a whole, by input name, e.g.
+    the STL datasets and reservation layers
+    states -- the entry of each matched state, by state abbreviation
+    """
+
+    files: dict[str, FileFingerprint] = field(default_factory=dict)
+    inputs: dict[str, str] = field(default_factory=dict)
+    states: dict[str, StateEntry] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: Path) -> "RunManifest":
+        """Read a run manifest, or start an empty one if it doesn't exist or
+        can't be read.
+
+        Arguments:
+        path -- the path to the manifest
+
+        Returns:
+        RunManifest -- the run manifest
+        """
+        try:
+            with open(path) as f:
+                data = json.load(f)
+
+            return cls(
+                files={k: FileFingerprint(**v) for k, v in data["files"].items()},
+                inputs=data["inputs"],
+                states={k: StateEntry(**v) for k, v in data["states"].items()},
+            )
+        except FileNotFoundError:
+            return cls()
+        except (KeyError, TypeError, ValueError):
+            logger.warning(f"Ignoring unreadable run manifest {path}")
+            return cls()
+
+    def save(self, path: Path) -> None:
+        """Write the run manifest.
+
+        Arguments:
+        path -- the path to write the manifest to
+
+        Returns:
+        None
+
+        Side effects:
+        Writes the manifest to path
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(asdict(self), f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    def hash_files(
+        self, paths: Iterable[Path], previous: Optional["RunManifest"] = None
+    ) -> str:
+        """Hash the contents of a set of data sources, recording every file's
+        fingerprint.
+
+        Arguments:
+        paths -- the data sources to hash; a shapefile includes its sidecars
+        previous -- the previous run's manifest, whose fingerprints are reused
+        for files that haven't changed since
+
+        Returns:
+        str -- the hex digest of the data sources' contents
+        """
+        digest = hashlib.sha256()
+        for source in paths:
+            for path in source_files(source):
+                fingerprint = fingerprint_file(
+                    path, None if previous is None else previous.files.get(str(path))
+                )
+                self.files[str(path)] = fingerprint
+                digest.update(path.name.encode())
+                digest.update(fingerprint.sha256.encode())
+
+        return digest.hexdigest()
+
+
+def fingerprint_file(
+    path: Path, previous: Optional[FileFingerprint] = None
+) -> FileFingerprint:
+    """Fingerprint a file, reusing its previous fingerprint if its size and
+    modification time are unchanged.
+
+    Arguments:
+    path -- the file to fingerprint
+    previous -- the file's fingerprint from the previous run, if any
+
+    Returns:
+    FileFingerprint -- the file's fingerprint
+    """
+    stat = path.stat()
+    if (
+        previous is not None
+        and previous.size == stat.st_size
+        and previous.mtime_ns == stat.st_mtime_ns
+    ):
+        return previous
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+
+    return FileFingerprint(stat.st_size, stat.st_mtime_ns, digest.hexdigest())
+
+
+def hash_value(value: Any) -> str:
+    """Hash a configuration value by its representation.
+
+    Arguments:
+    value -- the value to hash, e.g. a config section
+
+    Returns:
+    str -- the hex digest of the value
+    """
+    return hashlib.sha256(
+        json.dumps(value, sort_keys=True, default=repr).encode()
+    ).hexdigest()
+
+
+def hash_state_parcels(stl_gdf: gpd.GeoDataFrame, parcel_states: pd.Series) -> dict:
+    """Hash each state's parcels as the activity match sees them: their row
+    labels, states, rights types, and geometries.
+
+    Arguments:
+    stl_gdf -- the state trust lands GeoDataFrame
+    parcel_states -- the lowercased state of each parcel in stl_gdf
+
+    Returns:
+    dict[str, str] -- the hex digest of each state's parcels, by lowercased
+    state
+    """
+    row_hashes = pd.util.hash_pandas_object(
+        pd.DataFrame(
+            {
+                STATE: stl_gdf[STATE],
+                RIGHTS_TYPE: stl_gdf[RIGHTS_TYPE],
+                "wkb": shapely.to_wkb(np.asarray(stl_gdf.geometry.values)),
+            },
+            index=stl_gdf.index,
+        ),
+        index=True,
+    )
+
+    return {
+        state: hashlib.sha256(hashes.to_numpy().tobytes()).hexdigest()
+        for state, hashes in row_hashes.groupby(parcel_states, sort=True)
+    }
+
+
+def state_entry(
+    state: str,
+    activities_dir: Path,
+    parcels_hash: str,
+    mode: str,
+    match_dist_threshold: float,
+    manifest: RunManifest,
+    previous: Optional[RunManifest] = None,
+) -> StateEntry:
+    """Hash every input to a state's matches.
+
+    Arguments:
+    state -- the state abbreviation
+    activities_dir -- the directory containing state activity layers
+    parcels_hash -- the hash of the state's parcels
+    mode -- the matching engine used
+    match_dist_threshold -- the distance threshold used by the matching engine
+    manifest -- the current run's manifest, recording file fingerprints
+    previous -- the previous run's manifest, whose fingerprints are reused
+
+    Returns:
+    StateEntry -- the state's manifest entry
+    """
+    inputs = {
+        "version": str(MATCH_VERSION),
+        "mode": f"{mode}:{match_dist_threshold}",
+        "parcels": parcels_hash,
+        "config": hash_value(
+            {
+                "activities": STATE_ACTIVITIES[state],
+                "codes": STATE_ACTIVITY_CODES.get(state),
+                "rewrite_rules": ACTIVITY_REWRITE_RULES.get(state),
+                "name_rewrites": ACTIVITY_NAME_REWRITES,
+                "rights_types": ACTIVITY_RIGHTS_TYPE,
+            }
+        ),
+    }
+    for activity in STATE_ACTIVITIES[state].activities:
+        inputs[f"activity:{activity.location}"] = manifest.hash_files(
+            [activities_dir / activity.location], previous
+        )
+
+    return StateEntry(key=hash_value(inputs)[:16], inputs=inputs)
+
+
+def match_key(
+    activities_dir: Path,
+    mode: str,
+    match_dist_threshold: float,
+    manifest: RunManifest,
+    previous: Optional[RunManifest] = None,
+) -> str:
+    """Hash every input and option of the activity match beyond the parcels
+    matched: the matching logic, engine, and configuration of every state, and
+    every activity layer.
+
+    Arguments:
+    activities_dir -- the directory containing state activity layers
+    mode -- the matching engine used
+    match_dist_threshold -- the distance threshold used by the matching engine
+    manifest -- the current run's manifest, recording file fingerprints
+    previous -- the previous run's manifest, whose fingerprints are reused
+
+    Returns:
+    str -- the hex digest of the activity match's inputs
+    """
+    return hash_value(
+        {
+            "version": str(MATCH_VERSION),
+            "mode": f"{mode}:{match_dist_threshold}",
+            "config": hash_value(
+                {
+                    "activities": STATE_ACTIVITIES,
+                    "codes": STATE_ACTIVITY_CODES,
+                    "rewrite_rules": ACTIVITY_REWRITE_RULES,
+                    "name_rewrites": ACTIVITY_NAME_REWRITES,
+                    "rights_types": ACTIVITY_RIGHTS_TYPE,
+                }
+            ),
+            "activities": manifest.hash_files(
+                sorted(
+                    {
+                        activities_dir / activity.location
+                        for source in STATE_ACTIVITIES.values()
+                        for activity in source.activities
+                    }
+                ),
+                previous,
+            ),
+        }
+    )
+
+
+def state_matches_path(cache_dir: Path, state: str, key: str) -> Path:
+    """Determine where a state's matches are cached.
+
+    Arguments:
+    cache_dir -- the match cache directory
+    state -- the state abbreviation
+    key -- the state's key in the run manifest
+
+    Returns:
+    Path -- the path to the state's cached matches
+    """
+    return cache_path(cache_dir, state, key)
+
+
+def read_state_matches(cache_dir: Path, state: str, key: str) -> Optional[pd.DataFrame]:
+    """Read a state's cached matches, if they exist.
+
+    Arguments:
+    cache_dir -- the match cache directory
+    state -- the state abbreviation
+    key -- the state's key in the run manifest
+
+    Returns:
+    Optional[pd.DataFrame] -- the state's matches, or None on a cache miss
+    """
+    path = state_matches_path(cache_dir, state, key)
+    if not path.exists():
+        return None
+
+    return pd.read_parquet(path, columns=MATCH_COLUMNS)
+
+
+def write_state_matches(
+    cache_dir: Path, state: str, key: str, matches: pd.DataFrame
+) -> None:
+    """Cache a state's matches, replacing its stale matches.
+
+    Arguments:
+    cache_dir -- the match cache directory
+    state -- the state abbreviation
+    key -- the state's key in the run manifest
+    matches -- the state's matches
+
+    Returns:
+    None
+
+    Side effects:
+    Writes the state's matches to the match cache directory
+    """
+    write_snapshot(
+        matches[MATCH_COLUMNS],
+        cache_dir,
+        state,
+        state_matches_path(cache_dir, state, key),
+    )
+
+
+def log_changes(manifest: RunManifest, previous: RunManifest) -> None:
+    """Log the inputs that changed since the previous run.
+
+    Arguments:
+    manifest -- the current run's manifest
+    previous -- the previous run's manifest
+    """
+    changed = [
+        name
+        for name, value in manifest.inputs.items()
+        if previous.inputs.get(name) != value
+    ]
+    for state, entry in manifest.states.items():
+        previous_entry = previous.states.get(state)
+        changed.extend(
+            f"{state} {name}"
+            for name, value in entry.inputs.items()
+            if previous_entry is None or previous_entry.inputs.get(name) != value
+        )
+
+    if changed:
+        logger.info(f"Inputs changed since the last run: {', '.join(changed)}")
+    else:
+        logger.info("No inputs changed since the last run.")
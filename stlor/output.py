@@ -0,0 +1,296 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+import logging
+import os
+from pathlib import Path
+import shutil
+import time
+from typing import Any, Callable, Literal, NamedTuple, Optional, Sequence
+
+import geopandas as gpd
+import numpy as np
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+import pandas as pd
+import shapely
+
+from stlor.constants import WGS_84
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _write_geoparquet(gdf: gpd.GeoDataFrame, path: Path):
+    gdf.to_parquet(path, index=False, write_covering_bbox=True)
+
+
+def _write_flatgeobuf(gdf: gpd.GeoDataFrame, path: Path):
+    # FlatGeobuf can't mix 2D and 3D geometries, which the source datasets do
+    # (e.g. the 2D 01d and 3D 01e supplemental layers), so drop Z from mixed
+    # frames.
+    has_z = gdf.has_z[~gdf.geometry.is_empty & gdf.geometry.notna()]
+    if has_z.any() and not has_z.all():
+        gdf = gdf.set_geometry(shapely.force_2d(gdf.geometry.array))
+
+    gdf.to_file(path, driver="FlatGeobuf", SPATIAL_INDEX="YES")
+
+
+def _write_geojson(gdf: gpd.GeoDataFrame, path: Path):
+    gdf.to_file(path, driver="GeoJSON")
+
+
+def _write_csv(gdf: gpd.GeoDataFrame, path: Path):
+    gdf.to_csv(path, index=False)
+
+
+def _write_xlsx(gdf: gpd.GeoDataFrame, path: Path):
+    write_xlsx(gdf, path)
+
+
+# The maximum number of characters Excel allows in a single cell.
+XLSX_MAX_CELL_CHARS = 32_767
+
+# The number of rows converted to cell values at a time when writing XLSX.
+XLSX_CHUNK_SIZE = 10_000
+
+# How write_xlsx represents geometries:
+#   - "truncate" writes each geometry's WKT, cut to XLSX_MAX_CELL_CHARS.
+#   - "drop" leaves the geometry column out of the workbook.
+XlsxGeometry = Literal["truncate", "drop"]
+
+
+def _xlsx_value(value: Any) -> Any:
+    """Convert a DataFrame value to an openpyxl cell value, leaving missing
+    values blank as DataFrame.to_excel does.
+    """
+    if value is None or value is pd.NaT or value is pd.NA:
+        return None
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+
+    return value
+
+
+def write_xlsx(
+    gdf: gpd.GeoDataFrame,
+    path: Path,
+    geometry: XlsxGeometry = "truncate",
+    chunk_size: int = XLSX_CHUNK_SIZE,
+):
+    """Write a GeoDataFrame to XLSX, streaming rows to a write-only workbook.
+
+    Unlike DataFrame.to_excel, which builds the whole workbook in memory, this
+    converts and writes rows chunk_size at a time, so memory stays flat
+    however large the dataset is.
+
+    Arguments:
+    gdf -- the GeoDataFrame to write
+    path -- the path of the XLSX file
+    geometry -- whether to "truncate" geometries' WKT to fit in a cell or
+    "drop" the geometry column
+    chunk_size -- the number of rows converted at a time
+
+    Returns:
+    None
+
+    Side effects:
+    Writes the GeoDataFrame to path
+    """
+    geometry_col = gdf.geometry.name if isinstance(gdf, gpd.GeoDataFrame) else None
+    df = pd.DataFrame(gdf)
+    if geometry == "drop" and geometry_col is not None:
+        df = df.drop(columns=geometry_col)
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Sheet1")
+
+    header = []
+    for col in df.columns:
+        cell = WriteOnlyCell(sheet, value=str(col))
+        cell.font = Font(bold=True)
+        cell.border = Border(*(Side(style="thin"),) * 4)
+        cell.alignment = Alignment(horizontal="center", vertical="top")
+        header.append(cell)
+    sheet.append(header)
+
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start : start + chunk_size]
+        if geometry_col in chunk.columns:
+            wkt = shapely.to_wkt(
+                np.asarray(chunk[geometry_col].values, dtype=object),
+                rounding_precision=-1,
+            )
+            chunk = chunk.assign(
+                **{
+                    geometry_col: [
+                        None if w is None else w[:XLSX_MAX_CELL_CHARS] for w in wkt
+                    ]
+                }
+            )
+
+        for row in chunk.itertuples(index=False, name=None):
+            sheet.append([_xlsx_value(v) for v in row])
+
+    workbook.save(path)
+
+
+# The formats write_gdf_to_disk can write:
+#   - "geoparquet" is columnar and compressed, and the fastest to read back.
+#   - "flatgeobuf" carries a spatial index, supporting streaming bbox reads.
+#   - "geojson" is written in both EPSG:5070 and WGS 84 for the interactives.
+#   - "csv" and "xlsx" are for readers without GIS tooling.
+OutputFormat = Literal["geoparquet", "flatgeobuf", "geojson", "csv", "xlsx"]
+OUTPUT_FORMATS: list[OutputFormat] = [
+    "geoparquet",
+    "flatgeobuf",
+    "geojson",
+    "csv",
+    "xlsx",
+]
+
+# The suffixes read_gdf tries, in order of preference.
+READ_PREFERENCE = [".parquet", ".fgb", ".geojson"]
+
+
+class OutputArtifact(NamedTuple):
+    """A file written for every output dataset.
+
+    format -- the output format the artifact belongs to
+    suffix -- the suffix appended to the dataset's file name
+    wgs84 -- whether the artifact is written in WGS 84 rather than the dataset's
+    own CRS
+    write -- a function writing a GeoDataFrame to a path
+    """
+
+    format: OutputFormat
+    suffix: str
+    wgs84: bool
+    write: Callable[[gpd.GeoDataFrame, Path], None]
+
+
+# The artifacts written for every output dataset.
+OUTPUT_ARTIFACTS = [
+    OutputArtifact("geoparquet", ".parquet", False, _write_geoparquet),
+    OutputArtifact("flatgeobuf", ".fgb", False, _write_flatgeobuf),
+    OutputArtifact("geojson", ".geojson", False, _write_geojson),
+    OutputArtifact("geojson", "_WGS84.geojson", True, _write_geojson),
+    OutputArtifact("csv", ".csv", False, _write_csv),
+    OutputArtifact("xlsx", ".xlsx", False, _write_xlsx),
+]
+
+
+def write_gdf_to_disk(
+    gdf: gpd.GeoDataFrame,
+    output_dir: Path,
+    filename: str,
+    copies: Sequence[tuple[Path, str]] = (),
+    formats: Sequence[OutputFormat] = OUTPUT_FORMATS,
+) -> list[Path]:
+    """Write a GeoDataFrame to disk on GeoParquet, FlatGeobuf, GeoJSON
+    (EPSG:5070), GeoJSON (EPSG:4326), CSV, and XLSX formats.
+
+    Every artifact is written concurrently on its own thread, and the WGS 84
+    reprojection is computed once for all artifacts that need it. Copies of the
+    dataset under other names are made by copying the finished files rather
+    than serializing the dataset again.
+
+    Arguments:
+    gdf -- the GeoDataFrame to write to disk
+    output_dir -- the directory for the output files
+    filename -- the name of the output file
+    copies -- (directory, file name) pairs to copy every artifact to
+    formats -- the output formats to write
+
+    Returns:
+    list[Path] -- the paths of every file written, including copies
+
+    Side effects:
+    Writes the GeoDataFrame to disk
+    """
+    unknown = set(formats) - set(OUTPUT_FORMATS)
+    if unknown:
+        raise ValueError(f"Unknown output formats: {', '.join(sorted(unknown))}")
+
+    artifacts = [a for a in OUTPUT_ARTIFACTS if a.format in formats]
+
+    with ThreadPoolExecutor(max_workers=len(artifacts) + 1) as executor:
+        # Submitted first, so it's picked up before any writer waits on it.
+        wgs84: Future | None = None
+        if any(artifact.wgs84 for artifact in artifacts):
+            wgs84 = executor.submit(gdf.to_crs, WGS_84)
+
+        def write(artifact: OutputArtifact) -> list[Path]:
+            path = output_dir / f"{filename}{artifact.suffix}"
+            artifact.write(wgs84.result() if artifact.wgs84 else gdf, path)
+
+            copied = []
+            for copy_dir, copy_filename in copies:
+                copy_path = copy_dir / f"{copy_filename}{artifact.suffix}"
+                shutil.copyfile(path, copy_path)
+                copied.append(copy_path)
+
+            return [path, *copied]
+
+        paths = [path for paths in executor.map(write, artifacts) for path in paths]
+
+    # Stamp every artifact with the same modification time, so read_gdf can tell
+    # artifacts written together from stale ones left by an earlier run.
+    written_at = time.time()
+    for path in paths:
+        os.utime(path, (written_at, written_at))
+
+    return paths
+
+
+def read_gdf(path: Path, bbox: Optional[tuple] = None) -> gpd.GeoDataFrame:
+    """Read a dataset, preferring its fastest available format.
+
+    Given the path of any of a dataset's artifacts, this reads the first of its
+    GeoParquet, FlatGeobuf, or GeoJSON siblings (per READ_PREFERENCE) that
+    exists and is at least as new as the given path.
+
+    Arguments:
+    path -- the path of one of the dataset's artifacts, e.g. its GeoJSON
+    bbox -- an optional bounding box, in the dataset's CRS, to filter features
+
+    Returns:
+    gpd.GeoDataFrame -- the dataset
+    """
+    newest = path.stat().st_mtime if path.exists() else 0
+    candidates = [path.with_suffix(suffix) for suffix in READ_PREFERENCE]
+    source = next(
+        (c for c in candidates if c.exists() and c.stat().st_mtime >= newest),
+        path,
+    )
+    logger.info(f"Reading {source}")
+
+    if source.suffix == ".parquet":
+        return gpd.read_parquet(source, bbox=bbox)
+
+    return gpd.read_file(source, bbox=bbox)
+
+
+def publish_xlsx(path: Path, copies: Sequence[tuple[Path, str]] = ()) -> list[Path]:
+    """Write the XLSX artifact of a dataset whose XLSX was deferred, reading the
+    dataset back from its fastest available format.
+
+    Arguments:
+    path -- the path of one of the dataset's artifacts, e.g. its GeoJSON
+    copies -- (directory, file name) pairs to copy the XLSX artifact to
+
+    Returns:
+    list[Path] -- the paths of every file written, including copies
+    """
+    xlsx_path = path.with_suffix(".xlsx")
+    logger.info(f"Publishing {xlsx_path}")
+    write_xlsx(read_gdf(path), xlsx_path)
+
+    paths = [xlsx_path]
+    for copy_dir, copy_filename in copies:
+        copy_path = copy_dir / f"{copy_filename}.xlsx"
+        shutil.copyfile(xlsx_path, copy_path)
+        paths.append(copy_path)
+
+    return paths
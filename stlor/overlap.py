@@ -1,12 +1,48 @@
+from dataclasses import dataclass
 import itertools
-from functools import partial
+from functools import lru_cache, partial
+from typing import Any, Literal, NamedTuple
 
 import geopandas
 import numpy as np
+import pandas as pd
+import shapely
 from shapely import STRtree
 
 from stlor.constants import GEOMETRY
-from stlor.utils import batch_iterable, in_parallel
+from stlor.shared import SharedGeometries, read_shared_geometries
+from stlor.utils import in_parallel
+
+# The maximum distance between a parcel and an activity for the pair to be
+# considered a candidate match, in units of the STL coordinate reference system.
+MATCH_DIST_THRESHOLD = 2.0
+
+# The maximum number of activity records used to build a single R-tree index
+# in the "nearest" matching mode.
+MAX_RECORDS_IN_BATCH = 10_000
+
+# The matching engines supported by tree_based_proximity:
+#   - "nearest" probes an R-tree of activity envelopes with each parcel boundary
+#     and keeps only the single nearest activity per batch.
+#   - "query" uses a bulk "dwithin" R-tree query to return every activity within
+#     MATCH_DIST_THRESHOLD of each parcel, computing distances and spatial
+#     predicates as array operations.
+MatchMode = Literal["nearest", "query"]
+
+
+class CandidatePairs(NamedTuple):
+    """Candidate (parcel, activity) pairs, represented as parallel arrays.
+
+    parcel_indices -- positional indices of matched parcels
+    activity_indices -- positional indices of matched activities
+    distances -- the distance between each parcel boundary and activity envelope
+    predicates -- whether each pair satisfies check_spatial_predicates
+    """
+
+    parcel_indices: np.ndarray
+    activity_indices: np.ndarray
+    distances: np.ndarray
+    predicates: np.ndarray
 
 
 def check_spatial_predicates(geometry_1, geometry_2) -> bool:
@@ -41,6 +77,169 @@ def check_spatial_predicates(geometry_1, geometry_2) -> bool:
     )
 
 
+# Index permutation that transposes a flattened DE-9IM matrix, turning the
+# relationship of (a, b) into the relationship of (b, a).
+_TRANSPOSE_DE9IM = [0, 3, 6, 1, 4, 7, 2, 5, 8]
+
+
+def _relate_chars(geometries_1: np.ndarray, geometries_2: np.ndarray) -> np.ndarray:
+    """Compute the DE-9IM matrix for each pair of geometries, split into an
+    (n, 9) array of single-character cells. Missing geometries produce a row of
+    "F" cells, so no predicate is satisfied for them.
+    """
+    matrices = shapely.relate(geometries_1, geometries_2)
+    matrices = np.where(pd.isna(matrices), "FFFFFFFFF", matrices).astype("U9")
+
+    return matrices.view("U1").reshape(-1, 9)
+
+
+def _is_rectangle(geometries: np.ndarray) -> np.ndarray:
+    """Mirror GEOS' Polygon::isRectangle, which short-circuits covers for
+    axis-aligned rectangles: a hole-free, five-vertex shell whose vertices all
+    lie on the envelope and alternate between horizontal and vertical edges.
+    """
+    is_rectangle = (
+        (shapely.get_type_id(geometries) == shapely.GeometryType.POLYGON)
+        & (shapely.get_num_interior_rings(geometries) == 0)
+        & (shapely.get_num_coordinates(geometries) == 5)
+    )
+    if not is_rectangle.any():
+        return is_rectangle
+
+    coords = shapely.get_coordinates(geometries[is_rectangle]).reshape(-1, 5, 2)
+    mins = coords.min(axis=1, keepdims=True)
+    maxs = coords.max(axis=1, keepdims=True)
+    on_envelope = ((coords == mins) | (coords == maxs)).all(axis=(1, 2))
+    changed = np.diff(coords, axis=1) != 0
+    alternates = (changed[:, :, 0] != changed[:, :, 1]).all(axis=1)
+    is_rectangle[is_rectangle] = on_envelope & alternates
+
+    return is_rectangle
+
+
+def _covers(
+    chars: np.ndarray,
+    geometries_a: np.ndarray,
+    geometries_b: np.ndarray,
+    dims_a: np.ndarray,
+    dims_b: np.ndarray,
+) -> np.ndarray:
+    """Evaluate covers(a, b) against DE-9IM matrices, applying the same
+    short-circuit tests GEOS applies before computing the full relate.
+
+    contains is a special case of covers, and within(a, b) is contains(b, a), so
+    covers in both directions captures all three predicates.
+    """
+    # Either the interior or boundary of a intersects b, and no part of b lies
+    # in the exterior of a.
+    is_true = chars != "F"
+    relate_covers = (
+        (is_true[:, 0] | is_true[:, 1] | is_true[:, 3] | is_true[:, 4])
+        & ~is_true[:, 6]
+        & ~is_true[:, 7]
+    )
+
+    # A lower dimension cannot cover an area, and a point cannot cover a line
+    # of non-zero length.
+    dims_compatible = ~((dims_b == 2) & (dims_a < 2)) & ~(
+        (dims_b == 1) & (dims_a < 1) & (shapely.length(geometries_b) > 0.0)
+    )
+
+    bounds_a = shapely.bounds(geometries_a)
+    bounds_b = shapely.bounds(geometries_b)
+    envelope_covers = (
+        (bounds_a[:, 0] <= bounds_b[:, 0])
+        & (bounds_a[:, 1] <= bounds_b[:, 1])
+        & (bounds_a[:, 2] >= bounds_b[:, 2])
+        & (bounds_a[:, 3] >= bounds_b[:, 3])
+    )
+
+    return (
+        dims_compatible
+        & envelope_covers
+        & (_is_rectangle(geometries_a) | relate_covers)
+    )
+
+
+def _overlaps(chars: np.ndarray, dims_a: np.ndarray, dims_b: np.ndarray) -> np.ndarray:
+    """Evaluate overlaps(a, b) against DE-9IM matrices. Overlaps is only defined
+    for geometries of equal dimension, and lines must overlap in a line.
+    """
+    is_true = chars != "F"
+
+    return (
+        (dims_a == dims_b)
+        & (dims_a >= 0)
+        & is_true[:, 0]
+        & is_true[:, 2]
+        & is_true[:, 6]
+        & ((dims_a != 1) | (chars[:, 0] == "1"))
+    )
+
+
+def _relate_predicates(
+    geometries_a: np.ndarray, geometries_b: np.ndarray
+) -> np.ndarray:
+    """Evaluate covers(a, b), covers(b, a), and overlaps(a, b) from a single
+    relate pass over each pair of geometries.
+    """
+    chars = _relate_chars(geometries_a, geometries_b)
+    dims_a = shapely.get_dimensions(geometries_a)
+    dims_b = shapely.get_dimensions(geometries_b)
+
+    return (
+        _covers(chars, geometries_a, geometries_b, dims_a, dims_b)
+        | _covers(
+            chars[:, _TRANSPOSE_DE9IM], geometries_b, geometries_a, dims_b, dims_a
+        )
+        | _overlaps(chars, dims_a, dims_b)
+    )
+
+
+def check_spatial_predicates_batch(
+    geometries_1: np.ndarray,
+    geometries_2: np.ndarray,
+    boundaries_1: np.ndarray | None = None,
+    envelopes_2: np.ndarray | None = None,
+) -> np.ndarray:
+    """Evaluate check_spatial_predicates element-wise over two geometry arrays.
+
+    Rather than evaluating each of the sixteen predicates separately, this
+    computes a single DE-9IM matrix for each (geometry, geometry) pair and each
+    (boundary, envelope) pair and matches the predicate patterns against it.
+
+    Arguments:
+    geometries_1 -- an array of first feature geometries
+    geometries_2 -- an array of second feature geometries, aligned with
+    geometries_1
+    boundaries_1 -- the precomputed boundaries of geometries_1, if available
+    envelopes_2 -- the precomputed envelopes of geometries_2, if available
+
+    Returns:
+    np.ndarray -- a boolean array, True where any spatial predicate is satisfied
+    """
+    geometries_1 = np.asarray(geometries_1, dtype=object)
+    geometries_2 = np.asarray(geometries_2, dtype=object)
+    boundaries_1 = np.asarray(
+        shapely.boundary(geometries_1) if boundaries_1 is None else boundaries_1,
+        dtype=object,
+    )
+    envelopes_2 = np.asarray(
+        shapely.envelope(geometries_2) if envelopes_2 is None else envelopes_2,
+        dtype=object,
+    )
+
+    predicates = _relate_predicates(geometries_1, geometries_2)
+
+    # Only pairs that fail on their geometries need the boundary/envelope check.
+    remaining = ~predicates
+    predicates[remaining] = _relate_predicates(
+        boundaries_1[remaining], envelopes_2[remaining]
+    )
+
+    return predicates
+
+
 def smart_distance(g, batch, i) -> float:
     """Calculate the minimum distance between two geometries.
 
@@ -79,75 +278,495 @@ def smart_distance(g, batch, i) -> float:
     return min(dists)
 
 
-def _tree_based_proximity_batch(bounds, records, match_dist_threshold, batch):
-    """Build an R-tree spatial index on a batch of geographic features and probe
-    for matches with a list of geometry boundaries.
+@dataclass
+class ParcelIndex:
+    """A reusable spatial index over STL parcels.
+
+    Parcel geometries, boundaries, and envelopes are computed once and held as
+    shapely arrays alongside a prebuilt R-tree over the parcel envelopes, so the
+    same index can be probed by every activity layer in a run.
+
+    crs -- the coordinate reference system of the parcels
+    labels -- the parcels' row labels in the source GeoDataFrame
+    attributes -- the parcels' non-geometry columns, positionally indexed
+    geometries -- the parcel geometries
+    boundaries -- the parcel boundaries
+    envelopes -- the parcel envelopes
+    tree -- an R-tree spatial index over the parcel envelopes
+    """
+
+    crs: Any
+    labels: np.ndarray
+    attributes: pd.DataFrame
+    geometries: np.ndarray
+    boundaries: np.ndarray
+    envelopes: np.ndarray
+    tree: STRtree
+
+    @classmethod
+    def from_gdf(
+        cls, parcel_gdf: geopandas.GeoDataFrame, columns: list[str] | None = None
+    ) -> "ParcelIndex":
+        """Build a ParcelIndex from a GeoDataFrame of parcels.
+
+        Arguments:
+        parcel_gdf -- the GeoDataFrame of parcels
+        columns -- the non-geometry columns to carry in the index, or None to
+        carry all of them
+
+        Returns:
+        ParcelIndex -- the parcel index
+        """
+        attributes = (
+            parcel_gdf.drop(columns=parcel_gdf.geometry.name)
+            if columns is None
+            else parcel_gdf[columns]
+        )
+
+        return cls.from_geometries(
+            parcel_gdf.geometry.values,
+            crs=parcel_gdf.crs,
+            labels=parcel_gdf.index.to_numpy(),
+            attributes=pd.DataFrame(attributes).reset_index(drop=True),
+        )
+
+    @classmethod
+    def from_geometries(
+        cls,
+        geometries: np.ndarray,
+        crs: Any = None,
+        labels: np.ndarray | None = None,
+        attributes: pd.DataFrame | None = None,
+    ) -> "ParcelIndex":
+        """Build a ParcelIndex from an array of parcel geometries.
+
+        Arguments:
+        geometries -- the parcel geometries
+        crs -- the coordinate reference system of the parcels
+        labels -- the parcels' row labels, or None to label them by position
+        attributes -- the parcels' non-geometry columns, or None to carry none
+
+        Returns:
+        ParcelIndex -- the parcel index
+        """
+        geometries = np.asarray(geometries, dtype=object)
+        envelopes = shapely.envelope(geometries)
+
+        return cls(
+            crs=crs,
+            labels=np.arange(len(geometries)) if labels is None else labels,
+            attributes=(
+                pd.DataFrame(index=pd.RangeIndex(len(geometries)))
+                if attributes is None
+                else attributes
+            ),
+            geometries=geometries,
+            boundaries=shapely.boundary(geometries),
+            envelopes=envelopes,
+            tree=STRtree(envelopes),
+        )
+
+    def __len__(self) -> int:
+        return len(self.geometries)
+
+    def records(self, positions: np.ndarray) -> list[dict]:
+        """Materialize parcels as dictionary records.
+
+        Arguments:
+        positions -- the positional indices of the parcels to materialize
+
+        Returns:
+        list[dict] -- a record per position, including the parcel geometry
+        """
+        records = self.attributes.iloc[positions].to_dict(orient="records")
+        for record, geometry in zip(records, self.geometries[positions]):
+            record[GEOMETRY] = geometry
+
+        return records
+
+    def extent(self, distance: float = 0.0) -> geopandas.GeoSeries | None:
+        """Compute the bounding box of all parcels, grown by a distance.
+
+        The box's edges are densified so that it keeps covering the parcels
+        when reprojected to another coordinate reference system.
+
+        Arguments:
+        distance -- the distance to grow the bounding box by on every side
+
+        Returns:
+        geopandas.GeoSeries | None -- the bounding box in the index's CRS, or
+        None if the index is empty
+        """
+        if len(self) == 0:
+            return None
+
+        xmin, ymin, xmax, ymax = shapely.total_bounds(self.envelopes)
+        bbox = shapely.box(
+            xmin - distance, ymin - distance, xmax + distance, ymax + distance
+        )
+        bbox = shapely.segmentize(bbox, max(xmax - xmin, ymax - ymin, 1.0) / 32)
+
+        return geopandas.GeoSeries([bbox], crs=self.crs)
+
+
+def query_candidate_pairs(
+    parcel_index: ParcelIndex,
+    activity_geometries: np.ndarray,
+    match_dist_threshold: float = MATCH_DIST_THRESHOLD,
+) -> CandidatePairs:
+    """Find every (parcel, activity) pair whose envelopes lie within
+    match_dist_threshold of one another using a bulk R-tree query.
+
+    The envelope-to-envelope distance is the lower bound of the distances
+    considered by smart_distance, so a "dwithin" query on envelopes returns
+    exactly the pairs that smart_distance would accept.
 
     Arguments:
-    bounds -- a list of geometry boundaries to probe the R-tree index
-    records -- a dictionary of GeoDataFrame records
+    parcel_index -- the index of parcels to probe
+    activity_geometries -- an array of activity geometries
     match_dist_threshold -- the maximum distance threshold for a match
-    batch -- a list of features to build the R-tree index"""
-    envelopes = [None if g[GEOMETRY] is None else g[GEOMETRY].envelope for g in batch]
-    indices = STRtree(envelopes).nearest(bounds)
 
-    pairs = sorted(
-        [
-            (
-                g[GEOMETRY].boundary.distance(batch[i][GEOMETRY].envelope),
-                idx,
-                g,
-                batch[i],
-                check_spatial_predicates(g[GEOMETRY], batch[i][GEOMETRY]),
-                i,
-            )
-            for idx, (g, i) in enumerate(zip(records, indices))
-            if smart_distance(g, batch, i) <= match_dist_threshold
-        ],
-        key=lambda p: p[0],
+    Returns:
+    CandidatePairs -- the candidate pairs, with distances and spatial predicates
+    """
+    activity_geometries = np.asarray(activity_geometries, dtype=object)
+    activity_envelopes = shapely.envelope(activity_geometries)
+
+    activity_indices, parcel_indices = parcel_index.tree.query(
+        activity_envelopes, predicate="dwithin", distance=match_dist_threshold
+    )
+    order = np.lexsort((activity_indices, parcel_indices))
+    parcel_indices = parcel_indices[order]
+    activity_indices = activity_indices[order]
+
+    return _evaluate_pairs(
+        parcel_index,
+        activity_geometries,
+        activity_envelopes,
+        parcel_indices,
+        activity_indices,
+    )
+
+
+def nearest_candidate_pairs(
+    parcel_index: ParcelIndex,
+    activity_geometries: np.ndarray,
+    match_dist_threshold: float = MATCH_DIST_THRESHOLD,
+    max_records_in_batch: int = MAX_RECORDS_IN_BATCH,
+) -> CandidatePairs:
+    """Find, for each batch of activities, the activity nearest to each parcel
+    boundary, keeping pairs whose smart_distance is within match_dist_threshold.
+
+    Arguments:
+    parcel_index -- the index of parcels to probe with
+    activity_geometries -- an array of activity geometries
+    match_dist_threshold -- the maximum distance threshold for a match
+    max_records_in_batch -- the number of activities in each R-tree index
+
+    Returns:
+    CandidatePairs -- the candidate pairs, with distances and spatial predicates
+    """
+    activity_geometries = np.asarray(activity_geometries, dtype=object)
+
+    return concat_candidate_pairs(
+        in_parallel(
+            activity_batches(len(activity_geometries), max_records_in_batch),
+            partial(
+                match_batch,
+                parcel_index,
+                activity_geometries,
+                mode="nearest",
+                match_dist_threshold=match_dist_threshold,
+            ),
+            scheduler="threads",
+        )
+    )
+
+
+def activity_batches(
+    n_activities: int, max_records_in_batch: int = MAX_RECORDS_IN_BATCH
+) -> list[tuple[int, int]]:
+    """Split a layer of activities into contiguous batches.
+
+    Arguments:
+    n_activities -- the number of activities in the layer
+    max_records_in_batch -- the maximum number of activities in a batch
+
+    Returns:
+    list[tuple[int, int]] -- the (start, stop) positions of each batch
+    """
+    return [
+        (start, min(start + max_records_in_batch, n_activities))
+        for start in range(0, n_activities, max_records_in_batch)
+    ]
+
+
+def match_batch(
+    parcel_index: ParcelIndex,
+    activity_geometries: np.ndarray,
+    batch: tuple[int, int],
+    mode: MatchMode = "nearest",
+    match_dist_threshold: float = MATCH_DIST_THRESHOLD,
+) -> CandidatePairs:
+    """Find the candidate pairs between parcels and one batch of activities.
+
+    Batches are independent of one another, so they can be matched in any order
+    and on any worker, and their pairs combined with concat_candidate_pairs.
+
+    Arguments:
+    parcel_index -- the index of parcels to match against
+    activity_geometries -- an array of all activity geometries in the layer
+    batch -- the (start, stop) positions of the batch's activities
+    mode -- the matching engine to use, either "nearest" or "query"
+    match_dist_threshold -- the maximum distance threshold for a match
+
+    Returns:
+    CandidatePairs -- the batch's candidate pairs, with activity positions
+    relative to the whole layer
+    """
+    start, stop = batch
+    geometries = np.asarray(activity_geometries[start:stop], dtype=object)
+
+    if mode == "query":
+        pairs = query_candidate_pairs(parcel_index, geometries, match_dist_threshold)
+    elif mode == "nearest":
+        envelopes = shapely.envelope(geometries)
+        probes = np.flatnonzero(
+            ~shapely.is_missing(parcel_index.boundaries)
+            & ~shapely.is_empty(parcel_index.boundaries)
+        )
+        parcel_indices, activity_indices = _nearest_batch(
+            parcel_index, geometries, probes, match_dist_threshold, (0, envelopes)
+        )
+        pairs = _evaluate_pairs(
+            parcel_index,
+            geometries,
+            envelopes,
+            parcel_indices.astype(np.intp),
+            activity_indices.astype(np.intp),
+        )
+    else:
+        raise ValueError(f"Unknown matching mode: {mode}")
+
+    return pairs._replace(activity_indices=pairs.activity_indices + start)
+
+
+@lru_cache(maxsize=8)
+def _shared_parcel_index(parcel_geometries: SharedGeometries) -> ParcelIndex:
+    """Rebuild a ParcelIndex from shared parcel geometries, once per worker."""
+    return ParcelIndex.from_geometries(read_shared_geometries(parcel_geometries))
+
+
+def match_shared_batch(
+    parcel_geometries: SharedGeometries,
+    activity_geometries: SharedGeometries,
+    batch: tuple[int, int],
+    mode: MatchMode = "nearest",
+    match_dist_threshold: float = MATCH_DIST_THRESHOLD,
+) -> CandidatePairs:
+    """Run match_batch in a worker process against geometries in shared memory.
+
+    The worker rebuilds the parcel index once per set of parcels and decodes
+    only the batch's activities, so a task's arguments are just two handles
+    and a pair of positions, and its result is a handful of arrays.
+
+    Arguments:
+    parcel_geometries -- a handle to the shared parcel geometries
+    activity_geometries -- a handle to the shared activity geometries
+    batch -- the (start, stop) positions of the batch's activities
+    mode -- the matching engine to use, either "nearest" or "query"
+    match_dist_threshold -- the maximum distance threshold for a match
+
+    Returns:
+    CandidatePairs -- the batch's candidate pairs, with activity positions
+    relative to the whole layer
+    """
+    start, stop = batch
+    pairs = match_batch(
+        _shared_parcel_index(parcel_geometries),
+        read_shared_geometries(activity_geometries, start, stop),
+        (0, stop - start),
+        mode=mode,
+        match_dist_threshold=match_dist_threshold,
+    )
+
+    return pairs._replace(activity_indices=pairs.activity_indices + start)
+
+
+def concat_candidate_pairs(batches: list[CandidatePairs]) -> CandidatePairs:
+    """Combine the candidate pairs of a layer's batches, in batch order.
+
+    Arguments:
+    batches -- the candidate pairs of each batch
+
+    Returns:
+    CandidatePairs -- the combined candidate pairs
+    """
+    if not batches:
+        empty = np.array([], dtype=np.intp)
+        return CandidatePairs(
+            empty, empty, np.array([], dtype=float), np.array([], dtype=bool)
+        )
+
+    return CandidatePairs(
+        *(
+            np.concatenate([getattr(b, f) for b in batches])
+            for f in CandidatePairs._fields
+        )
+    )
+
+
+def _nearest_batch(
+    parcel_index: ParcelIndex,
+    activity_geometries: np.ndarray,
+    probes: np.ndarray,
+    match_dist_threshold: float,
+    batch: tuple[int, np.ndarray],
+) -> tuple[np.ndarray, np.ndarray]:
+    """Build an R-tree spatial index on a batch of activity envelopes and probe
+    it with parcel boundaries, keeping each parcel's nearest activity if it lies
+    within match_dist_threshold.
+
+    Arguments:
+    parcel_index -- the index of parcels to probe with
+    activity_geometries -- an array of all activity geometries
+    probes -- the positions of parcels with non-empty boundaries
+    match_dist_threshold -- the maximum distance threshold for a match
+    batch -- the offset of the batch and the batch's activity envelopes
+
+    Returns:
+    tuple[np.ndarray, np.ndarray] -- the parcel and activity positions of the
+    pairs within match_dist_threshold
+    """
+    start, envelopes = batch
+    activity_indices = STRtree(envelopes).nearest(parcel_index.boundaries[probes])
+    activity_indices = activity_indices + start
+
+    # Vectorized equivalent of smart_distance: the smallest non-NaN distance
+    # among envelope-envelope, boundary-boundary, and boundary-envelope.
+    activity_envelopes = envelopes[activity_indices - start]
+    distances = np.fmin(
+        np.fmin(
+            shapely.distance(parcel_index.envelopes[probes], activity_envelopes),
+            shapely.distance(
+                parcel_index.boundaries[probes],
+                shapely.boundary(activity_geometries[activity_indices]),
+            ),
+        ),
+        shapely.distance(parcel_index.boundaries[probes], activity_envelopes),
     )
+    within = distances <= match_dist_threshold
 
-    return pairs
+    return probes[within], activity_indices[within]
+
+
+def _evaluate_pairs(
+    parcel_index: ParcelIndex,
+    activity_geometries: np.ndarray,
+    activity_envelopes: np.ndarray,
+    parcel_indices: np.ndarray,
+    activity_indices: np.ndarray,
+) -> CandidatePairs:
+    """Compute distances and spatial predicates for candidate pairs."""
+    distances = shapely.distance(
+        parcel_index.boundaries[parcel_indices], activity_envelopes[activity_indices]
+    )
+    predicates = check_spatial_predicates_batch(
+        parcel_index.geometries[parcel_indices],
+        activity_geometries[activity_indices],
+        boundaries_1=parcel_index.boundaries[parcel_indices],
+        envelopes_2=activity_envelopes[activity_indices],
+    )
+
+    return CandidatePairs(parcel_indices, activity_indices, distances, predicates)
 
 
 def tree_based_proximity(
-    build_gdf: geopandas.GeoDataFrame, probe_gdf: geopandas.GeoDataFrame, crs: str
+    build: ParcelIndex | geopandas.GeoDataFrame,
+    probe_gdf: geopandas.GeoDataFrame,
+    crs: str,
+    mode: MatchMode = "nearest",
 ) -> itertools.chain:
-    """Find matches between two GeoDataFrames using an R-tree spatial index.
+    """Find matches between parcels and a GeoDataFrame of activities using an
+    R-tree spatial index.
 
     Arguments:
-    build_gdf -- the GeoDataFrame from which to build the R-tree index
+    build -- the ParcelIndex (or GeoDataFrame of parcels) to match against
     probe_gdf -- the GeoDataFrame to probe for matches
     crs -- the coordinate reference system for the GeoDataFrames
+    mode -- the matching engine to use, either "nearest" or "query"
 
     Returns:
-    itertools.chain -- an iterator over the matched pairs
+    itertools.chain -- an iterator over the matched pairs, as tuples of
+    (distance, parcel label, parcel record, activity record, predicate,
+    activity position), sorted by distance
     """
-    match_dist_threshold = 2.0
-    max_records_in_batch = 10_000
-
-    build_gdf_dict = build_gdf.to_dict(orient="records")
-    bounds = [g[GEOMETRY].boundary for g in build_gdf_dict if g[GEOMETRY] is not None]
+    parcel_index = (
+        build if isinstance(build, ParcelIndex) else ParcelIndex.from_gdf(build)
+    )
 
     probe_gdf = (
         probe_gdf.set_crs(crs, allow_override=True).to_crs(crs)
         if not probe_gdf.crs
         else probe_gdf.to_crs(crs)
     )
-    probe_gdf_dicts = probe_gdf.to_dict(orient="records")
+    activity_geometries = probe_gdf.geometry.values
 
-    batches = [probe_gdf_dicts]
-    if len(probe_gdf_dicts) > max_records_in_batch:
-        batches = batch_iterable(probe_gdf_dicts, max_records_in_batch, generator=True)
+    if mode == "query":
+        pairs = query_candidate_pairs(parcel_index, activity_geometries)
+    elif mode == "nearest":
+        pairs = nearest_candidate_pairs(parcel_index, activity_geometries)
+    else:
+        raise ValueError(f"Unknown matching mode: {mode}")
 
-    matches = in_parallel(
-        batches,
-        partial(
-            _tree_based_proximity_batch,
-            bounds,
-            build_gdf_dict,
-            match_dist_threshold,
-        ),
+    return iter_matches(parcel_index, probe_gdf, pairs)
+
+
+def iter_matches(
+    parcel_index: ParcelIndex,
+    probe_gdf: geopandas.GeoDataFrame,
+    pairs: CandidatePairs,
+) -> itertools.chain:
+    """Materialize candidate pairs as match tuples, sorted by distance.
+
+    Arguments:
+    parcel_index -- the index of parcels the pairs were matched against
+    probe_gdf -- the GeoDataFrame of activities the pairs were matched from
+    pairs -- the candidate pairs
+
+    Returns:
+    itertools.chain -- an iterator over the matched pairs, as tuples of
+    (distance, parcel label, parcel record, activity record, predicate,
+    activity position), sorted by distance
+    """
+    # Only the records participating in a candidate pair are materialized.
+    order = np.argsort(pairs.distances, kind="stable")
+    parcel_indices = pairs.parcel_indices[order]
+    activity_indices = pairs.activity_indices[order]
+
+    parcel_positions = np.unique(parcel_indices)
+    activity_positions = np.unique(activity_indices)
+    parcel_records = dict(zip(parcel_positions, parcel_index.records(parcel_positions)))
+    activity_records = dict(
+        zip(
+            activity_positions,
+            probe_gdf.iloc[activity_positions].to_dict(orient="records"),
+        )
     )
 
-    return itertools.chain.from_iterable(matches)
+    return itertools.chain(
+        (
+            distance,
+            parcel_index.labels[idx],
+            parcel_records[idx],
+            activity_records[i],
+            bool(contains),
+            int(i),
+        )
+        for distance, idx, i, contains in zip(
+            pairs.distances[order],
+            parcel_indices,
+            activity_indices,
+            pairs.predicates[order],
+        )
+    )
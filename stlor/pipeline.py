@@ -0,0 +1,241 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Callable, Optional
+
+import geopandas as gpd
+import pandas as pd
+import pyarrow.parquet as pq
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# The default location of stage checkpoints.
+CHECKPOINT_DIR = Path("data/.cache/checkpoints")
+
+
+@dataclass
+class Stage:
+    """A step of a pipeline, producing one or more DataFrames.
+
+    name -- the stage's name, used on the command line
+    run -- a function computing the stage's outputs from its inputs, passed
+    positionally in the order of inputs; it returns a single DataFrame if the
+    stage has one output, and a tuple of DataFrames in the order of outputs
+    otherwise
+    inputs -- the names of the outputs of earlier stages this stage consumes
+    outputs -- the names of the stage's outputs, which name their checkpoints;
+    defaults to the stage's name
+    key -- a key identifying the stage's own inputs and options beyond the
+    outputs it consumes, e.g. a hash of the files it reads
+    """
+
+    name: str
+    run: Callable[..., pd.DataFrame | tuple[pd.DataFrame, ...]]
+    inputs: list[str] = field(default_factory=list)
+    outputs: list[str] = field(default_factory=list)
+    key: str = ""
+
+    def __post_init__(self):
+        if not self.outputs:
+            self.outputs = [self.name]
+
+
+class Pipeline:
+    """A sequence of stages, each of which checkpoints its outputs.
+
+    Stages are declared in an order where every stage comes after the stages
+    producing its inputs. A run can start from any stage, reading the outputs
+    of earlier stages from their checkpoints, and stop after any later stage.
+    An optional restore function is applied to every output read back from a
+    checkpoint, e.g. to restore dtypes Parquet doesn't record.
+
+    Every output is keyed by its stage's key and the keys of the outputs the
+    stage consumes, so an output's key changes whenever anything upstream of it
+    does. The key is recorded next to the output's checkpoint, and a checkpoint
+    recorded under a different key, or none, is refused rather than silently
+    resumed from.
+    """
+
+    def __init__(
+        self,
+        stages: list[Stage],
+        checkpoint_dir: Path = CHECKPOINT_DIR,
+        restore: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None,
+    ):
+        names = [stage.name for stage in stages]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicate stage names: {', '.join(names)}")
+
+        keys: dict[str, str] = {}
+        for stage in stages:
+            unknown = set(stage.inputs) - set(keys)
+            if unknown:
+                raise ValueError(
+                    f"Stage {stage.name} depends on outputs not produced before it: "
+                    f"{', '.join(sorted(unknown))}"
+                )
+            if set(keys) & set(stage.outputs):
+                raise ValueError(
+                    f"Stage {stage.name} redefines outputs: "
+                    f"{', '.join(sorted(set(keys) & set(stage.outputs)))}"
+                )
+
+            digest = hashlib.sha256(
+                json.dumps(
+                    [stage.name, stage.key, [keys[name] for name in stage.inputs]]
+                ).encode()
+            ).hexdigest()[:16]
+            keys.update({name: digest for name in stage.outputs})
+
+        self.stages = stages
+        self.checkpoint_dir = checkpoint_dir
+        self.restore = restore
+        self.keys = keys
+
+    @property
+    def names(self) -> list[str]:
+        return [stage.name for stage in self.stages]
+
+    def checkpoint_path(self, name: str) -> Path:
+        """Determine where a stage output's checkpoint is written.
+
+        Arguments:
+        name -- the output's name
+
+        Returns:
+        Path -- the path to the output's (Geo)Parquet checkpoint
+        """
+        return self.checkpoint_dir / f"{name}.parquet"
+
+    def key_path(self, name: str) -> Path:
+        """Determine where the key of a stage output's checkpoint is recorded.
+
+        Arguments:
+        name -- the output's name
+
+        Returns:
+        Path -- the path to the checkpoint's key file
+        """
+        return self.checkpoint_dir / f"{name}.json"
+
+    def producer(self, name: str) -> str:
+        """Find the stage producing an output."""
+        return next(stage.name for stage in self.stages if name in stage.outputs)
+
+    def read_checkpoint(self, name: str) -> pd.DataFrame:
+        """Read a stage output from its checkpoint.
+
+        Arguments:
+        name -- the output's name
+
+        Returns:
+        pd.DataFrame -- the output, as a GeoDataFrame if it has geometries
+        """
+        path = self.checkpoint_path(name)
+        if not path.exists():
+            raise FileNotFoundError(
+                f"No checkpoint for {name} at {path}; run the stage producing it first"
+            )
+
+        try:
+            key = json.loads(self.key_path(name).read_text())["key"]
+        except (FileNotFoundError, KeyError, TypeError, ValueError):
+            key = None
+
+        if key != self.keys[name]:
+            raise ValueError(
+                f"The checkpoint for {name} at {path} was written from different "
+                f"inputs or options; rerun from stage {self.producer(name)} or "
+                "earlier"
+            )
+
+        logger.info(f"Reading {name} from {path}")
+
+        if b"geo" in (pq.read_schema(path).metadata or {}):
+            df = gpd.read_parquet(path)
+        else:
+            df = pd.read_parquet(path)
+
+        return df if self.restore is None else self.restore(df)
+
+    def write_checkpoint(self, name: str, gdf: pd.DataFrame) -> None:
+        """Write a stage output to its checkpoint.
+
+        Arguments:
+        name -- the output's name
+        gdf -- the output
+
+        Returns:
+        None
+
+        Side effects:
+        Writes the output's checkpoint, and its key next to it
+        """
+        path = self.checkpoint_path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Remove the previous checkpoint's key first, so a failed write never
+        # leaves a new checkpoint under an old key, or an old one under a new
+        # key.
+        key_path = self.key_path(name)
+        key_path.unlink(missing_ok=True)
+
+        # Write to a temporary file first so a failed write never leaves a
+        # partial checkpoint behind.
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        gdf.to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+
+        key_path.write_text(json.dumps({"key": self.keys[name]}))
+
+    def run(
+        self, from_stage: Optional[str] = None, until_stage: Optional[str] = None
+    ) -> dict[str, pd.DataFrame]:
+        """Run the stages from from_stage through until_stage.
+
+        Arguments:
+        from_stage -- the first stage to run, or None to start from the first
+        until_stage -- the last stage to run, or None to run through the last
+
+        Returns:
+        dict[str, pd.DataFrame] -- every output of the stages run, by name
+        """
+        for name in (from_stage, until_stage):
+            if name is not None and name not in self.names:
+                raise ValueError(
+                    f"Unknown stage {name}; expected one of {', '.join(self.names)}"
+                )
+
+        start = self.names.index(from_stage) if from_stage is not None else 0
+        stop = (
+            self.names.index(until_stage) + 1
+            if until_stage is not None
+            else len(self.stages)
+        )
+        if start >= stop:
+            raise ValueError(f"Stage {from_stage} comes after stage {until_stage}")
+
+        outputs: dict[str, pd.DataFrame] = {}
+        for stage in self.stages[start:stop]:
+            inputs = [
+                outputs[name] if name in outputs else self.read_checkpoint(name)
+                for name in stage.inputs
+            ]
+
+            logger.info(f"Running stage {stage.name}")
+            start_time = datetime.now()
+            results = stage.run(*inputs)
+            if len(stage.outputs) == 1:
+                results = (results,)
+
+            for name, result in zip(stage.outputs, results, strict=True):
+                outputs[name] = result
+                self.write_checkpoint(name, result)
+            logger.info(f"Stage {stage.name} took {datetime.now() - start_time}")
+
+        return outputs
@@ -0,0 +1,174 @@
+from dataclasses import dataclass
+import hashlib
+import logging
+from pathlib import Path
+from typing import Optional
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from stlor.cache import cache_path, hash_files, source_files, write_snapshot
+from stlor.constants import NAD_83_CONUS_ALBERS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# The reservation layers unioned into the reservation layer, in overlay order.
+RESERVATION_SOURCES = [
+    Path("public_data/00_Reservation Layer/BIA_AIAN+OK_Fixed.geojson"),
+    Path("public_data/00_Reservation Layer/BIA_Supplemental.geojson"),
+]
+
+# The default location of cached GeoParquet snapshots of the reservation layer.
+RESERVATION_CACHE_DIR = Path("data/.cache/reservations")
+
+# The names of the reservation layer's and its footprint's snapshots in the
+# cache.
+RESERVATION_LOCATION = "reservations"
+FOOTPRINT_LOCATION = "reservation_footprint"
+
+
+@dataclass
+class ReservationLayer:
+    """The union of the primary and supplemental reservation layers, with a
+    spatial index over its footprint.
+
+    gdf -- the reservation polygons, in NAD83 Conus Albers, with the attributes
+    of both source layers
+    footprint -- the polygons of the area covered by any reservation, i.e. the
+    parts of the dissolved layer, which neither overlap nor share edges
+    footprint_tree -- an STRtree over the footprint's polygons
+
+    The footprint's polygons are prepared, so repeated predicates against them
+    are fast.
+    """
+
+    gdf: gpd.GeoDataFrame
+    footprint: np.ndarray
+    footprint_tree: shapely.STRtree
+
+    @classmethod
+    def from_gdf(
+        cls, gdf: gpd.GeoDataFrame, footprint: Optional[np.ndarray] = None
+    ) -> "ReservationLayer":
+        """Index a reservation layer.
+
+        Arguments:
+        gdf -- the reservation polygons
+        footprint -- the polygons of the layer's footprint, or None to dissolve
+        the layer to compute them
+
+        Returns:
+        ReservationLayer -- the indexed reservation layer
+        """
+        if footprint is None:
+            footprint = dissolve_footprint(np.asarray(gdf.geometry.values))
+
+        shapely.prepare(footprint)
+
+        return cls(gdf, footprint, shapely.STRtree(footprint))
+
+    def __len__(self) -> int:
+        return len(self.gdf)
+
+
+def dissolve_footprint(geometries: np.ndarray) -> np.ndarray:
+    """Dissolve reservation polygons into the polygons of their footprint.
+
+    Arguments:
+    geometries -- the reservation polygons
+
+    Returns:
+    np.ndarray -- the polygons of the area covered by any reservation polygon
+    """
+    return shapely.get_parts(shapely.union_all(geometries))
+
+
+def reservation_cache_key(sources: list[Path] = RESERVATION_SOURCES) -> str:
+    """Compute the cache key of the reservation layer built from a set of
+    source layers.
+
+    Arguments:
+    sources -- the source layers, in overlay order
+
+    Returns:
+    str -- the cache key
+    """
+    digest = hashlib.sha256()
+    for source in sources:
+        digest.update(hash_files(source_files(source.resolve())).encode())
+    digest.update(gpd.GeoSeries(crs=NAD_83_CONUS_ALBERS).crs.to_wkt().encode())
+
+    return digest.hexdigest()[:16]
+
+
+def build_reservation_union(
+    sources: list[Path] = RESERVATION_SOURCES,
+) -> gpd.GeoDataFrame:
+    """Union the reservation source layers into a single layer.
+
+    Arguments:
+    sources -- the source layers, in overlay order
+
+    Returns:
+    gpd.GeoDataFrame -- the union of the source layers, in NAD83 Conus Albers
+    """
+    # Reproject all layers to NAD83 Conus Albers.
+    logger.info("Reprojecting reservation layers to NAD83 Conus Albers.")
+    layers = [
+        gpd.read_file(source.resolve()).to_crs(NAD_83_CONUS_ALBERS)
+        for source in sources
+    ]
+
+    logger.info("Unioning the BIA_AIAN primary and supplemental GeoDataFrames.")
+    reservations_gdf = layers[0]
+    for layer in layers[1:]:
+        reservations_gdf = reservations_gdf.overlay(layer, how="union")
+
+    return reservations_gdf
+
+
+def load_reservations(
+    sources: list[Path] = RESERVATION_SOURCES,
+    cache_dir: Path = RESERVATION_CACHE_DIR,
+) -> ReservationLayer:
+    """Load the union of the reservation layers, building it on a cache miss.
+
+    The union, and the footprint it dissolves to, are keyed by a hash of the
+    source layers' contents, so they are built once and then read back from
+    GeoParquet snapshots until a source changes.
+
+    Arguments:
+    sources -- the source layers, in overlay order
+    cache_dir -- the cache directory
+
+    Returns:
+    ReservationLayer -- the indexed reservation layer
+    """
+    key = reservation_cache_key(sources)
+    path = cache_path(cache_dir, RESERVATION_LOCATION, key)
+    footprint_path = cache_path(cache_dir, FOOTPRINT_LOCATION, key)
+
+    if not path.exists():
+        logger.info(f"Caching the reservation layer as {path.name}")
+        write_snapshot(
+            build_reservation_union(sources), cache_dir, RESERVATION_LOCATION, path
+        )
+
+    logger.info(f"Reading the reservation layer from {path.name}")
+    reservations_gdf = gpd.read_parquet(path)
+
+    if not footprint_path.exists():
+        logger.info(f"Caching the reservation footprint as {footprint_path.name}")
+        footprint = dissolve_footprint(np.asarray(reservations_gdf.geometry.values))
+        write_snapshot(
+            gpd.GeoDataFrame(geometry=footprint, crs=reservations_gdf.crs),
+            cache_dir,
+            FOOTPRINT_LOCATION,
+            footprint_path,
+        )
+
+    footprint = np.asarray(gpd.read_parquet(footprint_path).geometry.values)
+
+    return ReservationLayer.from_gdf(reservations_gdf, footprint)
@@ -0,0 +1,170 @@
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from contextlib import ExitStack
+from dataclasses import dataclass
+import logging
+import multiprocessing
+import os
+import time
+from typing import Any, Callable, Hashable, Literal, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# The kinds of workers a Scheduler can run its heaviest tasks on:
+#   - "threads" runs every task in a thread of the scheduling process.
+#   - "processes" additionally starts a pool of worker processes for tasks
+#     submitted with in_process=True. Their arguments are pickled, so they
+#     should carry handles to shared memory rather than large arrays.
+WorkerKind = Literal["threads", "processes"]
+
+
+@dataclass
+class TaskTiming:
+    """The wall-clock time a single task spent running on a worker.
+
+    key -- the task's key, e.g. (state, activity name, stage)
+    seconds -- the time the task took to run, in seconds
+    """
+
+    key: Hashable
+    seconds: float
+
+
+def _timed(fn: Callable[..., Any], *args, **kwargs) -> tuple[Any, float]:
+    """Run fn, returning its result alongside how long it took to run."""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+
+    return result, time.perf_counter() - start
+
+
+class Scheduler:
+    """A single pool of workers, sized to the machine's cores, that runs every
+    task of a job from one queue.
+
+    Tasks are submitted with a callback that runs on the calling thread when the
+    task completes. Callbacks may submit follow-up tasks, so a multi-stage job
+    (e.g. load a layer, then match each of its batches, then collect the
+    matches) can be expressed as a flat stream of tasks that keeps every worker
+    busy, instead of a nested pool per stage.
+
+    By default workers are threads: the heavy lifting in a task is expected to
+    be vectorized shapely, pyogrio, or pyarrow work, all of which release the
+    GIL. With workers="processes", tasks submitted with in_process=True run in
+    a pool of worker processes of the same size instead.
+    """
+
+    def __init__(
+        self, max_workers: Optional[int] = None, workers: WorkerKind = "threads"
+    ):
+        if workers not in ("threads", "processes"):
+            raise ValueError(f"Unknown worker kind: {workers}")
+
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.workers = workers
+        self.timings: list[TaskTiming] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._process_executor: Optional[ProcessPoolExecutor] = None
+        self._pending: dict[Future, tuple[Hashable, Optional[Callable]]] = {}
+
+    def submit(
+        self,
+        key: Hashable,
+        fn: Callable[..., Any],
+        *args,
+        then: Optional[Callable[[Any], None]] = None,
+        in_process: bool = False,
+        **kwargs,
+    ) -> None:
+        """Queue a task.
+
+        Arguments:
+        key -- a key identifying the task in timings and logs
+        fn -- the function to run on a worker
+        args, kwargs -- the arguments to call fn with
+        then -- an optional callback, run on the scheduling thread with fn's
+        result once the task completes
+        in_process -- whether to run the task in a worker process, if the
+        scheduler has any; fn, its arguments, and its result must be picklable
+        """
+        if self._executor is None:
+            raise RuntimeError("Tasks can only be submitted while the scheduler runs")
+
+        executor = (
+            self._process_executor
+            if in_process and self._process_executor is not None
+            else self._executor
+        )
+        future = executor.submit(_timed, fn, *args, **kwargs)
+        self._pending[future] = (key, then)
+
+    def run(self, start: Callable[["Scheduler"], None]) -> list[TaskTiming]:
+        """Run a job to completion.
+
+        Arguments:
+        start -- a function that submits the job's initial tasks
+
+        Returns:
+        list[TaskTiming] -- the timing of every task run by this job
+        """
+        timings = []
+        with ExitStack() as stack:
+            self._executor = stack.enter_context(
+                ThreadPoolExecutor(max_workers=self.max_workers)
+            )
+            if self.workers == "processes":
+                # Spawn rather than fork: the scheduling process already runs
+                # threads, which fork does not safely copy.
+                self._process_executor = stack.enter_context(
+                    ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+                )
+
+            try:
+                start(self)
+                while self._pending:
+                    done, _ = wait(self._pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        key, then = self._pending.pop(future)
+                        result, seconds = future.result()
+                        timings.append(TaskTiming(key, seconds))
+                        logger.debug(f"Task {key} took {seconds:.3f}s")
+                        if then is not None:
+                            then(result)
+            except BaseException:
+                for executor in (self._executor, self._process_executor):
+                    if executor is not None:
+                        executor.shutdown(wait=True, cancel_futures=True)
+                raise
+            finally:
+                self._executor = None
+                self._process_executor = None
+                self._pending.clear()
+
+        self.timings.extend(timings)
+
+        return timings
+
+
+def log_timings(timings: list[TaskTiming], top: int = 10) -> None:
+    """Log a summary of task timings, including the slowest tasks.
+
+    Arguments:
+    timings -- the task timings to summarize
+    top -- the number of slowest tasks to list
+    """
+    if not timings:
+        return
+
+    total = sum(t.seconds for t in timings)
+    logger.info(f"Ran {len(timings)} tasks totalling {total:.1f}s of worker time")
+    for timing in sorted(timings, key=lambda t: t.seconds, reverse=True)[:top]:
+        logger.info(f"  {timing.key}: {timing.seconds:.2f}s")
@@ -0,0 +1,141 @@
+import logging
+from typing import Optional
+
+import pandas as pd
+from pandas.api.types import is_float_dtype, is_numeric_dtype
+
+from stlor.constants import (
+    ACRES,
+    ACTIVITY,
+    ACTIVITY_INFO,
+    ACTIVITY_INFO_2,
+    ALIQUOT,
+    CLIPPED_ACRES,
+    COUNTY,
+    DATA_SOURCE,
+    GIS_ACRES,
+    LAYER,
+    LEASE_STATUS,
+    LESSEE,
+    MANAGING_AGENCY,
+    MERIDIAN,
+    NET_ACRES,
+    OBJECT_ID,
+    RANGE,
+    RESERVATION_NAME,
+    RIGHTS_TYPE,
+    RIGHTS_TYPE_INFO,
+    SECTION,
+    STATE,
+    STATE_ENABLING_ACT,
+    TOWNSHIP,
+    TRUST_NAME,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Free text is stored as pyarrow-backed strings rather than Python objects.
+STRING = pd.StringDtype("pyarrow")
+
+# The dtype of each column of the STL GeoDataFrame, from load through the final
+# dataset:
+#   - "category" for low-cardinality columns, which repeat a few dozen values
+#     across every parcel.
+#   - STRING for free text.
+#   - "float64" for acreages, which the source datasets mix with blank
+#     strings; blanks are read as missing, so acres and net_acres are written
+#     out as numbers, with blanks as empty values.
+# reservation_name is stored as a string rather than a category, since
+# aggregate.py groups by it and categorical groupbys include unobserved
+# categories.
+STL_SCHEMA: dict[str, Optional[str | pd.StringDtype]] = {
+    OBJECT_ID: STRING,
+    STATE: "category",
+    MANAGING_AGENCY: "category",
+    STATE_ENABLING_ACT: "category",
+    TRUST_NAME: "category",
+    RESERVATION_NAME: STRING,
+    RIGHTS_TYPE: "category",
+    RIGHTS_TYPE_INFO: "category",
+    ACRES: "float64",
+    GIS_ACRES: "float64",
+    NET_ACRES: "float64",
+    CLIPPED_ACRES: "float64",
+    ACTIVITY: STRING,
+    ACTIVITY_INFO: STRING,
+    ACTIVITY_INFO_2: STRING,
+    COUNTY: "category",
+    MERIDIAN: "category",
+    TOWNSHIP: STRING,
+    RANGE: STRING,
+    SECTION: STRING,
+    ALIQUOT: STRING,
+    LAYER: "category",
+    LEASE_STATUS: STRING,
+    LESSEE: STRING,
+    DATA_SOURCE: "category",
+}
+
+# The dtype of each column of the final dataset, whose object_id is the
+# numeric object_id_LAST.
+FINAL_DATASET_SCHEMA = {**STL_SCHEMA, OBJECT_ID: "int64"}
+
+
+def apply_schema(
+    df: pd.DataFrame,
+    schema: dict[str, Optional[str | pd.StringDtype]] = STL_SCHEMA,
+) -> pd.DataFrame:
+    """Cast the columns of a DataFrame to the dtypes declared in a schema.
+
+    Columns absent from the schema, or declared as None, are left as they are,
+    as are columns that already have their declared dtype. Text columns cast to
+    floats are parsed as numbers; blank values become missing values, and any
+    other value that isn't a number becomes a missing value with a warning.
+
+    Arguments:
+    df -- the DataFrame, e.g. the state trust lands GeoDataFrame
+    schema -- the dtype of each column
+
+    Returns:
+    pd.DataFrame -- the DataFrame with its columns cast
+    """
+    dtypes = {
+        column: dtype
+        for column, dtype in schema.items()
+        if dtype is not None and column in df.columns and df[column].dtype != dtype
+    }
+
+    if not dtypes:
+        return df
+
+    numbers = {
+        column: parse_numbers(df[column])
+        for column, dtype in dtypes.items()
+        if is_float_dtype(dtype) and not is_numeric_dtype(df[column])
+    }
+
+    return df.assign(**numbers).astype(dtypes)
+
+
+def parse_numbers(values: pd.Series) -> pd.Series:
+    """Parse a column of numbers stored as text, or mixed with text.
+
+    Arguments:
+    values -- the column
+
+    Returns:
+    pd.Series -- the parsed numbers, missing where a value is blank or isn't a
+    number
+    """
+    numbers = pd.to_numeric(values, errors="coerce")
+
+    text = values.astype("string").str.strip()
+    invalid = numbers.isna() & text.notna() & text.ne("")
+    if invalid.any():
+        logger.warning(
+            f"Reading {invalid.sum()} non-numeric values of {values.name} as "
+            f"missing, e.g. {', '.join(repr(v) for v in text[invalid].unique()[:5])}"
+        )
+
+    return numbers
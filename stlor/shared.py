@@ -0,0 +1,91 @@
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+from typing import Optional
+
+import numpy as np
+import shapely
+
+
+@dataclass(frozen=True)
+class SharedGeometries:
+    """A picklable handle to an array of geometries held as WKB in shared memory.
+
+    The shared memory block starts with a table of count + 1 int64 offsets,
+    followed by the WKB of every geometry back to back; geometry i occupies
+    bytes offsets[i]:offsets[i + 1] of the WKB section. A missing geometry is
+    stored as zero bytes.
+
+    name -- the name of the shared memory block
+    count -- the number of geometries
+    """
+
+    name: str
+    count: int
+
+
+def share_geometries(
+    geometries: np.ndarray,
+) -> tuple[SharedMemory, SharedGeometries]:
+    """Copy an array of geometries into a new shared memory block as WKB.
+
+    The caller owns the returned block and must close() and unlink() it once
+    no worker needs the geometries anymore.
+
+    Arguments:
+    geometries -- the geometries to share
+
+    Returns:
+    tuple[SharedMemory, SharedGeometries] -- the shared memory block and a
+    handle to pass to workers
+    """
+    wkb = shapely.to_wkb(np.asarray(geometries, dtype=object))
+    lengths = np.array([0 if b is None else len(b) for b in wkb], dtype=np.int64)
+    offsets = np.zeros(len(wkb) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    size = offsets.nbytes + int(offsets[-1])
+    shm = SharedMemory(create=True, size=max(size, 1))
+    buffer = np.ndarray(size, dtype=np.uint8, buffer=shm.buf)
+    buffer[: offsets.nbytes] = offsets.view(np.uint8)
+    buffer[offsets.nbytes :] = np.frombuffer(
+        b"".join(b for b in wkb if b is not None), dtype=np.uint8
+    )
+    del buffer
+
+    return shm, SharedGeometries(shm.name, len(wkb))
+
+
+def read_shared_geometries(
+    handle: SharedGeometries, start: int = 0, stop: Optional[int] = None
+) -> np.ndarray:
+    """Rebuild a slice of a shared geometry array.
+
+    Only the WKB of the requested slice is read; nothing is pickled or copied
+    between processes.
+
+    Arguments:
+    handle -- the handle to the shared geometries
+    start -- the position of the first geometry to read
+    stop -- the position after the last geometry to read, or None to read to
+    the end
+
+    Returns:
+    np.ndarray -- the geometries in positions start:stop
+    """
+    stop = handle.count if stop is None else stop
+    shm = SharedMemory(name=handle.name)
+    try:
+        offsets = np.ndarray(handle.count + 1, dtype=np.int64, buffer=shm.buf)
+        wkb_offsets = offsets[start : stop + 1] + offsets.nbytes
+        del offsets
+        wkb = np.array(
+            [
+                bytes(shm.buf[lo:hi]) if hi > lo else None
+                for lo, hi in zip(wkb_offsets[:-1], wkb_offsets[1:])
+            ],
+            dtype=object,
+        )
+    finally:
+        shm.close()
+
+    return shapely.from_wkb(wkb)
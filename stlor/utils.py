@@ -1,6 +1,7 @@
 from typing import Any, Iterator
 
 import dask.bag as db
+import pandas as pd
 from dask.diagnostics import ProgressBar
 
 
@@ -26,15 +27,18 @@ def batch_iterable(
     )
 
 
-def in_parallel(items: list[Any], fn) -> list[Any]:
+def in_parallel(items: list[Any], fn, scheduler="processes") -> list[Any]:
     """Execute a function on a list of items in parallel using dask.
 
     Arguments:
     items {list[Any]} -- a list of items to process
     fn {Any} -- a function to apply over each item
+    scheduler {str} -- the dask scheduler to use; "threads" avoids pickling
+    arguments into worker processes and suits GIL-releasing work such as
+    vectorized shapely operations
     """
     with ProgressBar():
-        return db.from_sequence(items).map(fn).compute(scheduler="processes")
+        return db.from_sequence(items).map(fn).compute(scheduler=scheduler)
 
 
 def _clean_and_split(s: str, sep: str) -> list[str]:
@@ -67,3 +71,57 @@ def combine_delim_list(existing: str, update: str, sep=",") -> str:
 
     combined = set(existing_vals + update_vals)
     return sep.join(sorted(combined))
+
+
+def _drop_nan_lists(values: pd.Series) -> pd.Series:
+    """Remove missing values, and the values of every index label whose values
+    together read as "nan", the long-form equivalent of _clean_and_split's "nan"
+    check.
+
+    Arguments:
+    values {pd.Series} -- a long-form series of delimited lists
+
+    Returns:
+    pd.Series -- the remaining values, as strings
+    """
+    values = values.dropna().astype(str)
+    is_nan = values == "nan"
+    only_nan = is_nan.groupby(level=0).transform("all")
+
+    return values[~only_nan]
+
+
+def combine_delim_lists(
+    existing: pd.Series, update: pd.Series, sep: str = ","
+) -> pd.Series:
+    """Combine delimited lists of strings by index label, removing duplicates and
+    sorting. This is the vectorized equivalent of calling combine_delim_list
+    for each label, with the label's update values joined by sep.
+
+    Arguments:
+    existing {pd.Series} -- the existing list of strings for each index label
+    update {pd.Series} -- a long-form series of new lists of strings, where each
+    index label may appear any number of times
+
+    Returns:
+    pd.Series -- the combined list of strings for each index label that has a
+    non-empty combined list
+    """
+    values = pd.concat([_drop_nan_lists(existing), _drop_nan_lists(update)])
+
+    parts = values.str.split(sep).explode().str.strip()
+    parts = parts[parts.notna() & (parts != "")]
+    parts = (
+        parts.rename("value")
+        .rename_axis("label")
+        .reset_index()
+        .drop_duplicates()
+        .sort_values("value", kind="stable")
+    )
+
+    return (
+        parts.groupby("label", sort=False)["value"]
+        .agg(sep.join)
+        .rename(None)
+        .rename_axis(None)
+    )
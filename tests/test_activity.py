@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from stlor.activity import (
+    concatenate_activity_info,
+    concatenate_activity_info_columns,
+)
+from stlor.constants import ACTIVITY_INFO, ACTIVITY_INFO_2
+
+VALUES = [
+    "",
+    " ",
+    "\n",
+    "layer_index: 1 activity: Grazing lease_status: Active lessee: A",
+    "  layer_index: 2 activity: Oil and Gas lease_status: Expired lessee: B\n",
+    "layer_index: 3 activity: Mining\nlayer_index: 4 activity: Timber",
+    "continued entry lessee: C",
+]
+
+
+def row_wise(df: pd.DataFrame) -> list[str]:
+    return df.apply(concatenate_activity_info, axis=1).tolist()
+
+
+@pytest.fixture
+def pairs() -> pd.DataFrame:
+    values_1, values_2 = zip(*((a, b) for a in VALUES for b in VALUES))
+
+    return pd.DataFrame({ACTIVITY_INFO: values_1, ACTIVITY_INFO_2: values_2})
+
+
+@pytest.mark.parametrize("dtype", [object, "string[python]", "string[pyarrow]"])
+def test_columns_match_row_wise(pairs, dtype):
+    pairs = pairs.astype(dtype)
+
+    assert concatenate_activity_info_columns(
+        pairs[ACTIVITY_INFO], pairs[ACTIVITY_INFO_2]
+    ).tolist() == row_wise(pairs)
+
+
+@pytest.mark.parametrize(
+    "dtype, missing",
+    [(object, np.nan), (object, None), ("string[pyarrow]", pd.NA)],
+)
+def test_missing_values_are_empty(pairs, dtype, missing):
+    pairs = pairs.astype(dtype)
+    with_missing = pairs.copy()
+    with_missing.loc[with_missing[ACTIVITY_INFO] == "", ACTIVITY_INFO] = missing
+    with_missing.loc[with_missing[ACTIVITY_INFO_2] == "", ACTIVITY_INFO_2] = missing
+
+    assert with_missing.isna().any().all()
+    assert concatenate_activity_info_columns(
+        with_missing[ACTIVITY_INFO], with_missing[ACTIVITY_INFO_2]
+    ).tolist() == row_wise(pairs)
+
+
+def test_index_is_preserved(pairs):
+    pairs.index = pairs.index * 2 + 7
+
+    assert concatenate_activity_info_columns(
+        pairs[ACTIVITY_INFO], pairs[ACTIVITY_INFO_2]
+    ).index.equals(pairs.index)
@@ -0,0 +1,94 @@
+import pandas as pd
+import pytest
+
+from stlor.activity import (
+    build_activity_info,
+    concatenate_activity_info,
+    render_activity_info,
+)
+from stlor.constants import (
+    ACTIVITY_INFO,
+    ACTIVITY_INFO_2,
+    ACTIVITY_NAME,
+    LAYER_INDEX,
+    LEASE_STATUS,
+    LESSEE,
+    MATCH_COLUMNS,
+    ROW_IDX,
+)
+from stlor.lessee import parcel_lessees, parse_lessee
+
+# Each parcel's matched activities, as (layer_index, activity, lease_status,
+# lessee), and its activity_info_2 value.
+PARCELS = {
+    10: ([("0", "Grazing", "Active", "A")], ""),
+    11: (
+        [("0", "Grazing", "Active", "A")],
+        "layer_index: 9 activity: Mining lease_status: Active lessee: B",
+    ),
+    12: ([], "layer_index: 9 activity: Mining lease_status: Active lessee: B"),
+    # activity_info_2 continues the last matched entry, whose own lease status
+    # and lessee come first.
+    13: ([("0", "Grazing", "Active", "A")], "lease_status: Active lessee: C"),
+    # The continuation is read as the lessee of an entry without one.
+    14: ([("0", "Grazing", "Active", "")], "CONTINUED CO"),
+    15: ([("0", "Grazing", "Expired", "E")], "lease_status: Active lessee: F"),
+    16: ([], "lease_status: Active lessee: D"),
+    17: (
+        [("0", "Grazing", "Active", "A; G"), ("1", "Oil and Gas", "Producing", "H")],
+        " more text\nlayer_index: 9 activity: Mining lease_status: Issued lessee: I",
+    ),
+    18: ([("0", "Grazing", "Active", "A")], None),
+    19: ([], None),
+}
+
+
+@pytest.fixture
+def activity_info() -> pd.DataFrame:
+    matches = pd.DataFrame(
+        [
+            (row, activity, layer_index, lease_status, lessee)
+            for row, (entries, _) in PARCELS.items()
+            for layer_index, activity, lease_status, lessee in entries
+        ],
+        columns=[ROW_IDX, ACTIVITY_NAME, LAYER_INDEX, LEASE_STATUS, LESSEE],
+    )[MATCH_COLUMNS]
+
+    return build_activity_info(matches)
+
+
+@pytest.fixture
+def activity_info_2() -> pd.Series:
+    return pd.Series(
+        [value for _, value in PARCELS.values()],
+        index=list(PARCELS),
+        dtype="string[pyarrow]",
+        name=ACTIVITY_INFO_2,
+    )
+
+
+def test_parcel_lessees_match_parsing_concatenated_text(activity_info, activity_info_2):
+    rendered = render_activity_info(activity_info, activity_info_2.index)
+    expected = [
+        parse_lessee(
+            concatenate_activity_info(
+                {
+                    ACTIVITY_INFO: info,
+                    ACTIVITY_INFO_2: "" if pd.isna(info_2) else info_2,
+                }
+            )
+        )
+        for info, info_2 in zip(rendered, activity_info_2)
+    ]
+
+    assert parcel_lessees(activity_info, activity_info_2).tolist() == expected
+
+
+def test_continuation_entries(activity_info, activity_info_2):
+    lessees = parcel_lessees(activity_info, activity_info_2)
+
+    assert lessees[13] == "A"
+    assert lessees[14] == "CONTINUED CO"
+    assert lessees[15] == ""
+    assert lessees[16] == "D"
+    assert lessees[17] == "A; G; H; I"
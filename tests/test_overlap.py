@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+from shapely import LineString, MultiPolygon, Point, Polygon, box
+
+from stlor.overlap import check_spatial_predicates, check_spatial_predicates_batch
+
+EDGE_CASES = {
+    "touching": (box(0, 0, 1, 1), box(1, 0, 2, 1)),
+    "touching at a corner": (box(0, 0, 1, 1), box(1, 1, 2, 2)),
+    "contained": (box(0, 0, 4, 4), box(1, 1, 2, 2)),
+    "containing": (box(1, 1, 2, 2), box(0, 0, 4, 4)),
+    "equal": (box(0, 0, 1, 1), box(0, 0, 1, 1)),
+    "overlapping": (box(0, 0, 2, 2), box(1, 1, 3, 3)),
+    "disjoint within threshold": (box(0, 0, 1, 1), box(2, 0, 3, 1)),
+    "disjoint within threshold, non-rectangular": (
+        Polygon([(0, 0), (3, 0), (0, 3)]),
+        Polygon([(3, 3), (4, 3), (4, 4)]),
+    ),
+    "empty first": (Polygon(), box(0, 0, 1, 1)),
+    "empty second": (box(0, 0, 1, 1), Polygon()),
+    "both empty": (Polygon(), Polygon()),
+    "multipart overlapping one part": (
+        MultiPolygon([box(0, 0, 1, 1), box(2, 0, 3, 1)]),
+        box(0.5, 0, 1.5, 1),
+    ),
+    "multipart around a polygon": (
+        MultiPolygon([box(0, 0, 1, 1), box(2, 0, 3, 1)]),
+        box(1.25, 0.25, 1.75, 0.75),
+    ),
+    "polygon in a multipart's envelope": (
+        box(1.25, 0.25, 1.75, 0.75),
+        MultiPolygon([box(0, 0, 1, 1), box(2, 0, 3, 1)]),
+    ),
+    "point on a boundary": (box(0, 0, 1, 1), Point(1, 0.5)),
+    "line crossing": (box(0, 0, 1, 1), LineString([(-1, 0.5), (2, 0.5)])),
+}
+
+
+def scalar_predicates(geometries_1, geometries_2):
+    return np.array(
+        [check_spatial_predicates(a, b) for a, b in zip(geometries_1, geometries_2)]
+    )
+
+
+@pytest.mark.parametrize("pair", EDGE_CASES.values(), ids=EDGE_CASES.keys())
+def test_batch_matches_scalar_on_edge_cases(pair):
+    geometries_1 = np.array([pair[0]], dtype=object)
+    geometries_2 = np.array([pair[1]], dtype=object)
+
+    np.testing.assert_array_equal(
+        check_spatial_predicates_batch(geometries_1, geometries_2),
+        scalar_predicates(geometries_1, geometries_2),
+    )
+
+
+def random_geometry(rng):
+    x, y = rng.integers(0, 6, 2)
+    kind = rng.integers(0, 6)
+    if kind == 0:
+        return Point(x + rng.choice([0, 0.5]), y)
+    if kind == 1:
+        return box(x, y, x + rng.integers(1, 4), y + rng.integers(1, 4))
+    if kind == 2:
+        return LineString([(x, y), (x + rng.integers(-3, 4), y + rng.integers(1, 4))])
+    if kind == 3:
+        return MultiPolygon([box(x, y, x + 1, y + 1), box(x + 2, y, x + 3, y + 1)])
+    if kind == 4:
+        return Polygon([(x, y), (x + 3, y), (x, y + 3)])
+    return Polygon()
+
+
+def test_batch_matches_scalar_on_random_pairs():
+    rng = np.random.default_rng(0)
+    geometries_1 = np.array([random_geometry(rng) for _ in range(5_000)], dtype=object)
+    geometries_2 = np.array([random_geometry(rng) for _ in range(5_000)], dtype=object)
+
+    expected = scalar_predicates(geometries_1, geometries_2)
+
+    np.testing.assert_array_equal(
+        check_spatial_predicates_batch(geometries_1, geometries_2), expected
+    )
+    # The pairs exercise both outcomes.
+    assert expected.any() and not expected.all()
+
+
+def test_batch_accepts_precomputed_boundaries_and_envelopes():
+    rng = np.random.default_rng(1)
+    geometries_1 = np.array([random_geometry(rng) for _ in range(500)], dtype=object)
+    geometries_2 = np.array([random_geometry(rng) for _ in range(500)], dtype=object)
+
+    np.testing.assert_array_equal(
+        check_spatial_predicates_batch(
+            geometries_1,
+            geometries_2,
+            boundaries_1=np.array([g.boundary for g in geometries_1], dtype=object),
+            envelopes_2=np.array([g.envelope for g in geometries_2], dtype=object),
+        ),
+        scalar_predicates(geometries_1, geometries_2),
+    )